@@ -0,0 +1,82 @@
+"""
+Synthetic benchmark clips generated locally with ffmpeg's testsrc2 source.
+
+Clips are written once into a work directory and reused by later runs;
+the file name encodes every generation parameter, so changing a clip
+definition never picks up a stale file.
+"""
+
+import os
+import subprocess
+
+# name -> generation parameters
+CLIPS = {
+    'h264_480p_gop30': {'size': '854x480', 'rate': 30, 'codec': 'libx264', 'gop': 30},
+    'h264_720p_gop60': {'size': '1280x720', 'rate': 30, 'codec': 'libx264', 'gop': 60},
+    'h264_1080p_gop250': {'size': '1920x1080', 'rate': 30, 'codec': 'libx264', 'gop': 250},
+    'h264_720p_bframes': {'size': '1280x720', 'rate': 25, 'codec': 'libx264', 'gop': 50, 'bframes': 3,
+                          'ext': 'mkv'},
+    'h264_720p_vfr': {'size': '1280x720', 'rate': 30, 'codec': 'libx264', 'gop': 60, 'vfr': True},
+    # Stream-copied from mid-GOP: starts with packets the demuxer flags as discarded
+    'h264_720p_trimmed': {'size': '1280x720', 'rate': 25, 'codec': 'libx264', 'gop': 50, 'bframes': 2,
+                          'trim': 1.1},
+    'hevc_720p_gop60': {'size': '1280x720', 'rate': 30, 'codec': 'libx265', 'gop': 60},
+    'vp9_720p_gop60': {'size': '1280x720', 'rate': 30, 'codec': 'libvpx-vp9', 'gop': 60, 'ext': 'webm'},
+    'mpeg4_480p_gop12': {'size': '854x480', 'rate': 25, 'codec': 'mpeg4', 'gop': 12, 'ext': 'avi'},
+}
+
+# Small subset for a fast smoke run
+QUICK_CLIPS = ('h264_480p_gop30', 'h264_720p_vfr', 'h264_720p_trimmed')
+
+CODEC_ARGS = {
+    'libx264': ['-preset', 'veryfast', '-pix_fmt', 'yuv420p'],
+    'libx265': ['-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-x265-params', 'log-level=error'],
+    'libvpx-vp9': ['-deadline', 'realtime', '-cpu-used', '8', '-b:v', '2M', '-pix_fmt', 'yuv420p'],
+    'mpeg4': ['-q:v', '4'],
+}
+
+
+def available_encoders(ffmpeg_path):
+    """Names of the video encoders this ffmpeg build provides"""
+    result = subprocess.run([ffmpeg_path, '-hide_banner', '-encoders'], capture_output=True, text=True)
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith('V'):
+            names.add(parts[1])
+    return names
+
+
+def clip_filename(name, seconds):
+    clip = CLIPS[name]
+    return f"{name}_{clip['size']}_{clip['rate']}_{seconds}s.{clip.get('ext', 'mp4')}"
+
+
+def make_clip(ffmpeg_path, name, directory, seconds=10):
+    """Generate clip name in directory (if missing) and return its path"""
+    clip = CLIPS[name]
+    path = os.path.join(directory, clip_filename(name, seconds))
+    if os.path.exists(path):
+        return path
+
+    cmd = [
+        ffmpeg_path, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={clip['size']}:rate={clip['rate']}:duration={seconds}",
+    ]
+    if clip.get('vfr'):
+        # Every third frame is held 50% longer: irregular but monotonic timestamps
+        cmd += ['-vf', f"setpts='(N+floor(N/3)*0.5)/{clip['rate']}/TB'", '-fps_mode', 'vfr']
+    cmd += ['-c:v', clip['codec'], '-g', str(clip['gop']), *CODEC_ARGS[clip['codec']]]
+    if 'bframes' in clip:
+        cmd += ['-bf', str(clip['bframes'])]
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.part' + os.path.splitext(path)[1]
+    subprocess.run(cmd + [tmp_path], check=True)
+    if clip.get('trim'):
+        source, tmp_path = tmp_path, path + '.trim' + os.path.splitext(path)[1]
+        subprocess.run([ffmpeg_path, '-v', 'error', '-y', '-ss', str(clip['trim']), '-i', source,
+                        '-c', 'copy', tmp_path], check=True)
+        os.remove(source)
+    os.replace(tmp_path, path)
+    return path
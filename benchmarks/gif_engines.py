@@ -0,0 +1,91 @@
+"""
+Compare the Pillow and FFmpeg palette GIF engines on the platform presets.
+
+Frames are decoded once at each preset's width, then every engine encodes
+the same frames; encode time and output size are reported. pillow_full is
+the Pillow engine storing every frame whole, for comparison with its
+default changed-pixels-only frames.
+
+Usage:
+    python benchmarks/gif_engines.py [video] [--frames N] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from video2pic_core import VideoPlayer, GIF_PRESETS  # noqa: E402
+from clips import make_clip  # noqa: E402
+
+
+def run(video_path, frame_count, player):
+    if not player.load_video(video_path):
+        raise SystemExit(f"Cannot load {video_path}")
+    info = player.video_info
+    frames = range(min(frame_count, info['total_frames']))
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='gif_bench_') as out_dir:
+            for preset, (width, fps) in GIF_PRESETS.items():
+                size = (width, int(info['height'] * width / info['width']))
+                images = [img for _, img in player.iter_frames(frames, size=size, scale_flags='lanczos')]
+
+                engines = {
+                    'pillow_full': lambda out: player.ffmpeg.create_gif(images, out, fps=fps, width=width,
+                                                                         optimize=False),
+                    'pillow': lambda out: player.ffmpeg.create_gif(images, out, fps=fps, width=width),
+                    'ffmpeg': lambda out: player.ffmpeg.create_gif_palette(images, out, fps=fps, width=width),
+                    'ffmpeg_diff': lambda out: player.ffmpeg.create_gif_palette(images, out, fps=fps, width=width,
+                                                                                 stats_mode='diff'),
+                }
+                for engine, encode in engines.items():
+                    out = os.path.join(out_dir, f'{preset}_{engine}.gif')
+                    start = time.perf_counter()
+                    ok = encode(out)
+                    elapsed = time.perf_counter() - start
+                    results.append({
+                        'preset': preset,
+                        'engine': engine,
+                        'frames': len(images),
+                        'ok': ok,
+                        'encode_ms': round(elapsed * 1000, 1),
+                        'size_kb': round(os.path.getsize(out) / 1024, 1) if ok else None,
+                    })
+    finally:
+        player.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('video', nargs='?', help='input video (default: generated test clip)')
+    parser.add_argument('--frames', type=int, default=60, help='number of frames per GIF')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    player = VideoPlayer(disk_cache=False)
+    video_path = args.video
+    if not video_path:
+        video_path = make_clip(player.ffmpeg.ffmpeg_path, 'h264_720p_gop60',
+                               os.path.join(tempfile.gettempdir(), 'ronvideo2pic_bench', 'clips'))
+
+    results = run(video_path, args.frames, player)
+
+    print(f"{'preset':<10}{'engine':<14}{'frames':>7}{'encode ms':>12}{'size KB':>10}")
+    for r in results:
+        print(f"{r['preset']:<10}{r['engine']:<14}{r['frames']:>7}{r['encode_ms']:>12}{str(r['size_kb']):>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+"""
+Benchmark frame extraction and GIF export on synthetic clips.
+
+Every (clip, scenario) pair runs in a fresh child process with an empty
+disk cache, so results are cold-start numbers and peak RSS is measured
+per scenario. Metrics ending in _fps, _speedup or _hit_pct are better when
+higher; all others (_ms, _kb, _mb) are better when lower.
+
+Usage:
+    python benchmarks/suite.py [--quick] [--clips a,b] [--scenarios seek,gif] [--repeat 3]
+                               [--json out.json] [--save-baseline base.json]
+                               [--baseline base.json] [--tolerance 15]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from video2pic_core import VideoPlayer, DiskCache, FFmpegHelper, GIF_PRESETS, parallel_workers  # noqa: E402
+from clips import CLIPS, QUICK_CLIPS, CODEC_ARGS, available_encoders, make_clip  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SEED = 1234
+
+
+# ============================================================
+# Scenarios
+# ============================================================
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def latency_summary(prefix, samples):
+    return {
+        f'{prefix}_p50_ms': round(percentile(samples, 50) * 1000, 2),
+        f'{prefix}_p90_ms': round(percentile(samples, 90) * 1000, 2),
+        f'{prefix}_mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def bench_load(player, path, work):
+    """Cold load: probe plus frame index"""
+    start = time.perf_counter()
+    player.load_video(path)
+    return {'load_ms': round((time.perf_counter() - start) * 1000, 2),
+            'frames': player.video_info['total_frames']}
+
+
+def bench_seek(player, path, work, count=30):
+    """Random-access latency of full-resolution frames"""
+    player.load_video(path)
+    total = player.video_info['total_frames']
+    rng = random.Random(SEED)
+    samples = []
+    for frame in rng.sample(range(total), min(count, total)):
+        player.frame_cache.clear()
+        start = time.perf_counter()
+        player.get_frame_image(frame)
+        samples.append(time.perf_counter() - start)
+    return latency_summary('seek', samples)
+
+
+def bench_step(player, path, work, count=120):
+    """Latency of stepping forward one frame at a time"""
+    player.load_video(path)
+    total = player.video_info['total_frames']
+    first = random.Random(SEED).randrange(max(1, total - count))
+    player.get_frame_image(first)
+    samples = []
+    for frame in range(first + 1, min(total, first + 1 + count)):
+        start = time.perf_counter()
+        player.get_frame_image(frame)
+        samples.append(time.perf_counter() - start)
+    return latency_summary('step', samples)
+
+
+def bench_playback(player, path, work, count=250, width=640):
+    """Sequential decode throughput at preview size"""
+    player.load_video(path)
+    info = player.video_info
+    size = (width, int(info['height'] * width / info['width']))
+    frames = range(min(count, info['total_frames']))
+    start = time.perf_counter()
+    for frame in frames:
+        player.get_preview_image(frame, size)
+    elapsed = time.perf_counter() - start
+    return {'playback_fps': round(len(frames) / elapsed, 2)}
+
+
+def bench_export(player, path, work, count=100, step=2):
+    """Batch PNG export of every other frame"""
+    player.load_video(path)
+    frames = list(range(0, min(count * step, player.video_info['total_frames']), step))
+    folder = os.path.join(work, 'export')
+    os.makedirs(folder, exist_ok=True)
+    start = time.perf_counter()
+    written = player.create_exporter().export(frames, folder)
+    elapsed = time.perf_counter() - start
+    return {'export_fps': round(written / elapsed, 2), 'export_ms': round(elapsed * 1000, 1)}
+
+
+def bench_gif(player, path, work, count=60, preset='general'):
+    """GIF encode time and size for each engine on decoded frames"""
+    player.load_video(path)
+    info = player.video_info
+    width, fps = GIF_PRESETS[preset]
+    size = (width, int(info['height'] * width / info['width']))
+    frames = range(min(count, info['total_frames']))
+    images = [img for _, img in player.iter_frames(frames, size=size, scale_flags='lanczos')]
+
+    result = {}
+    engines = {
+        'pillow_full': lambda out: player.ffmpeg.create_gif(images, out, fps=fps, width=width,
+                                                             optimize=False),
+        'pillow': lambda out: player.ffmpeg.create_gif(images, out, fps=fps, width=width),
+        'ffmpeg': lambda out: player.ffmpeg.create_gif_palette(images, out, fps=fps, width=width),
+    }
+    for engine, encode in engines.items():
+        out = os.path.join(work, f'{engine}.gif')
+        start = time.perf_counter()
+        ok = encode(out)
+        elapsed = time.perf_counter() - start
+        if ok:
+            result[f'gif_{engine}_ms'] = round(elapsed * 1000, 1)
+            result[f'gif_{engine}_kb'] = round(os.path.getsize(out) / 1024, 1)
+    return result
+
+
+def bench_parallel(player, path, work, count=900):
+    """Segment-parallel against single-process decoding of a long range"""
+    player.load_video(path)
+    info = player.video_info
+    frames = range(min(count, info['total_frames']))
+
+    def rate(decode):
+        start = time.perf_counter()
+        n = sum(1 for _ in decode())
+        return n / (time.perf_counter() - start)
+
+    workers = parallel_workers(info['width'] * info['height'] * 3,
+                               player.frame_cache.limit_bytes / (1024 * 1024))
+    serial = rate(lambda: player.iter_frames(frames, workers=1))
+    parallel = rate(lambda: player.iter_frames(frames, workers=workers))
+    result = {
+        'decode_serial_fps': round(serial, 2),
+        'decode_parallel_fps': round(parallel, 2),
+        'decode_speedup': round(parallel / serial, 2),
+    }
+
+    def scenes(n):
+        start = time.perf_counter()
+        analysis = player.ffmpeg.analyze_scenes(path, info, player.frame_index, workers=n)
+        return len(analysis) / (time.perf_counter() - start)
+
+    serial, parallel = scenes(1), scenes(None)
+    result.update({
+        'scenes_serial_fps': round(serial, 2),
+        'scenes_parallel_fps': round(parallel, 2),
+        'scenes_speedup': round(parallel / serial, 2),
+        'workers': workers,
+    })
+    return result
+
+
+def bench_review(player, path, work, count=150, revisits=300, hot_frames=16, warm_frames=48):
+    """Revisiting full-resolution frames with a small tiered frame cache.
+
+    The hot and warm tiers hold only hot_frames and (about) warm_frames
+    frames, so revisits exercise every tier; *_hit_pct are better when
+    higher. The first pass waits for background compression after each
+    frame, like someone looking at every frame, so warm is filled the
+    normal way rather than by uncompressed spills.
+    """
+    player.load_video(path)
+    info = player.video_info
+    frames = list(range(min(count, info['total_frames'])))
+    frame_mb = info['width'] * info['height'] * 3 / (1024 * 1024)
+    cache = player.frame_cache
+    cache.set_limit(frame_mb * hot_frames)
+    # Size warm by the real compressed size, so it overflows into cold
+    sample = player.get_frame_image(frames[len(frames) // 2]).tobytes()
+    cache.warm_limit_bytes = len(zlib.compress(sample, cache.compress_level)) * warm_frames
+    cache.clear()
+
+    decode = []
+    for frame in frames:
+        start = time.perf_counter()
+        player.get_frame_image(frame)
+        decode.append(time.perf_counter() - start)
+        while cache.pending:
+            time.sleep(0.001)
+
+    rng = random.Random(SEED)
+    revisit = []
+    for _ in range(revisits):
+        frame = rng.choice(frames)
+        start = time.perf_counter()
+        player.get_frame_image(frame)
+        revisit.append(time.perf_counter() - start)
+
+    stats = cache.stats()
+    result = latency_summary('decode', decode)
+    result.update(latency_summary('revisit', revisit))
+    for name, tier in stats['tiers'].items():
+        result[f'{name}_hit_pct'] = round(tier['hit_ratio'] * 100, 1)
+        if 'restore_ms' in tier:
+            result[f'{name}_restore_ms'] = round(tier['restore_ms'], 2)
+    result['warm_compress_ms'] = round(stats['tiers']['warm']['compress_ms'], 2)
+    return result
+
+
+def bench_accuracy(player, path, work, count=40, size=(160, 90)):
+    """Frame count and decoded pictures against a plain ffmpeg decode.
+
+    Frames are compared at a small size, scaled the same way by ffmpeg on
+    both sides.
+    wrong_frames and index_frames_off must be 0; any other value fails the
+    run regardless of the baseline.
+    """
+    player.load_video(path)
+    info = player.video_info
+    frame_bytes = size[0] * size[1] * 3
+    cmd = [player.ffmpeg.ffmpeg_path, '-v', 'error', '-i', path, '-fps_mode', 'passthrough',
+           '-vf', f'scale={size[0]}:{size[1]}:flags=area', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    reference = subprocess.run(cmd, capture_output=True, check=True).stdout
+    decoded = len(reference) // frame_bytes
+    expected = lambda frame: reference[frame * frame_bytes:(frame + 1) * frame_bytes]  # noqa: E731
+
+    frames = range(min(decoded, info['total_frames']))
+    rng = random.Random(SEED)
+    wrong = 0
+    decoder = player.ffmpeg.open_decoder(path, info, player.frame_index, size, 'area')
+    try:
+        for frame in rng.sample(frames, min(count, len(frames))):
+            img = decoder.read_frame(frame)
+            wrong += img is None or img.tobytes() != expected(frame)
+    finally:
+        decoder.close()
+    for frame, img in player.iter_frames(sorted(rng.sample(frames, min(count, len(frames)))), size=size,
+                                         scale_flags='area'):
+        wrong += img.tobytes() != expected(frame)
+    return {'wrong_frames': wrong, 'index_frames_off': abs(info['total_frames'] - decoded),
+            'frames': decoded}
+
+
+SCENARIOS = {
+    'load': bench_load,
+    'seek': bench_seek,
+    'step': bench_step,
+    'playback': bench_playback,
+    'export': bench_export,
+    'gif': bench_gif,
+    'parallel': bench_parallel,
+    'review': bench_review,
+    'accuracy': bench_accuracy,
+}
+
+# Metrics that must be zero in every run
+ACCURACY_METRICS = ('wrong_frames', 'index_frames_off')
+
+
+def peak_rss():
+    """Peak resident set size of this process, in MB"""
+    if resource is None:
+        return {}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024), 1)}
+
+
+class ChildRSSSampler(threading.Thread):
+    """Tracks the largest VmHWM of this process's children (ffmpeg) on Linux.
+
+    RUSAGE_CHILDREN cannot be used: a child's ru_maxrss includes the
+    memory it shared with this process between fork and exec. Children
+    are polled from /proc; VmHWM is their own peak so far, so a decoder
+    is measured fully as long as it is seen once before it exits.
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stop = threading.Event()
+        self.peak_kb = 0
+
+    def run(self):
+        me = os.getpid()
+        while not self.stop.wait(self.interval):
+            self.sample(me)
+
+    def sample(self, me):
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    # The command name may contain spaces; fields after it do not
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                if ppid != me:
+                    continue
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            self.peak_kb = max(self.peak_kb, int(line.split()[1]))
+            except (OSError, ValueError, IndexError):
+                continue  # exited meanwhile
+
+    def result(self):
+        """Stop sampling; empty if every child exited before it was seen"""
+        self.stop.set()
+        self.join()
+        return {'peak_ffmpeg_rss_mb': round(self.peak_kb / 1024, 1)} if self.peak_kb else {}
+
+
+def run_child(scenario, clip_path):
+    """Child process entry: run one scenario and print its JSON result"""
+    work = tempfile.mkdtemp(prefix='v2p_bench_')
+    player = VideoPlayer(disk_cache=DiskCache(root=os.path.join(work, 'cache')))
+    sampler = ChildRSSSampler() if os.path.isdir('/proc/self') else None
+    if sampler:
+        sampler.start()
+    try:
+        result = SCENARIOS[scenario](player, clip_path, work)
+    finally:
+        player.cleanup()
+        shutil.rmtree(work, ignore_errors=True)
+    result.update(peak_rss())
+    if sampler:
+        result.update(sampler.result())
+    print(json.dumps(result))
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+def run_scenario(scenario, clip_path, repeat=1, timeout=600):
+    """Run a scenario repeat times in child processes; return the median of each metric"""
+    runs = []
+    for _ in range(repeat):
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', scenario, clip_path]
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'no output')
+        runs.append(json.loads(lines[-1]))
+    return {key: percentile([run[key] for run in runs], 50) for key in runs[0]}
+
+
+def environment(ffmpeg_path, seconds, repeat):
+    version = subprocess.run([ffmpeg_path, '-version'], capture_output=True, text=True).stdout
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'ffmpeg': version.splitlines()[0] if version else None,
+        'clip_seconds': seconds,
+        'repeat': repeat,
+        'seed': SEED,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Yield (clip, scenario, metric, base, current, change %, regressed)"""
+    base = {(r['clip'], r['scenario']): r['metrics'] for r in baseline['results'] if r.get('metrics')}
+    for r in results:
+        old = base.get((r['clip'], r['scenario']))
+        if not old or not r.get('metrics'):
+            continue
+        for metric, value in r['metrics'].items():
+            before = old.get(metric)
+            if not isinstance(value, (int, float)) or not before or metric in ('frames', 'workers') + ACCURACY_METRICS:
+                continue
+            change = (value - before) / before * 100
+            worse = -change if metric.endswith(('_fps', '_speedup', '_hit_pct')) else change
+            yield r['clip'], r['scenario'], metric, before, value, change, worse > tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--child', nargs=2, metavar=('SCENARIO', 'CLIP'), help=argparse.SUPPRESS)
+    parser.add_argument('--quick', action='store_true', help=f"only {', '.join(QUICK_CLIPS)}")
+    parser.add_argument('--clips', help='comma-separated clip names (default: all)')
+    parser.add_argument('--scenarios', help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--seconds', type=int, default=10, help='length of generated clips')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per scenario; the median of each metric is reported')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'ronvideo2pic_bench'),
+                        help='directory for generated clips (reused between runs)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--save-baseline', help='write results as a baseline file')
+    parser.add_argument('--baseline', help='compare against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=15.0,
+                        help='percent change counted as a regression (default: 15)')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return 0
+
+    ffmpeg_path = FFmpegHelper().ffmpeg_path
+    encoders = available_encoders(ffmpeg_path)
+    names = args.clips.split(',') if args.clips else list(QUICK_CLIPS if args.quick else CLIPS)
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    for name in names:
+        if name not in CLIPS:
+            parser.error(f"unknown clip {name}")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario}")
+
+    results = []
+    for name in names:
+        codec = CLIPS[name]['codec']
+        if codec not in encoders or codec not in CODEC_ARGS:
+            results.append({'clip': name, 'scenario': None, 'skipped': f'encoder {codec} not available'})
+            print(f"{name}: skipped ({codec} not available)", file=sys.stderr)
+            continue
+        clip_path = make_clip(ffmpeg_path, name, os.path.join(args.work, 'clips'), args.seconds)
+        for scenario in scenarios:
+            record = {'clip': name, 'scenario': scenario}
+            try:
+                record['metrics'] = run_scenario(scenario, clip_path, max(1, args.repeat))
+            except Exception as e:
+                record['error'] = str(e)
+            results.append(record)
+            print(f"{name:<20}{scenario:<10}{json.dumps(record.get('metrics', record.get('error')))}",
+                  file=sys.stderr)
+
+    failures = [(r['clip'], metric, r['metrics'][metric]) for r in results if r.get('metrics')
+                for metric in ACCURACY_METRICS if r['metrics'].get(metric)]
+    for clip, metric, value in failures:
+        print(f"{clip}: {metric} = {value}", file=sys.stderr)
+
+    report = {'environment': environment(ffmpeg_path, args.seconds, args.repeat), 'results': results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"{'clip':<20}{'scenario':<10}{'metric':<22}{'baseline':>10}{'current':>10}{'change':>9}")
+        for clip, scenario, metric, before, value, change, regressed in compare(results, baseline,
+                                                                                args.tolerance):
+            regressions += regressed
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{clip:<20}{scenario:<10}{metric:<22}{before:>10}{value:>10}{change:>+8.1f}%{flag}")
+        print(f"{regressions} regression(s) beyond {args.tolerance:g}%")
+        return 1 if regressions or failures else 0
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
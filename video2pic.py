@@ -11,15 +11,15 @@ Features:
 """
 
 import os
-import sys
-import subprocess
-import tempfile
-import shutil
 import locale
+import threading
+import time
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
-import json
+from tkinter import ttk, filedialog, messagebox, font as tkfont
+from PIL import ImageTk
+
+from video2pic_core import (VideoPlayer, GifSizeFitter, report_frames, metrics, GIF_PRESETS, GIF_ENGINES,
+                            GIF_DITHERS, GIF_STATS_MODES)
 
 
 # ============================================================
@@ -45,12 +45,19 @@ LANG_ZH = {
     'speed': '播放速度:',
     'ready': '就绪 - 请打开视频文件',
     'loading': '正在加载视频...',
+    'indexing': '正在建立帧索引... {n} 帧',
+    'auto_select': '按镜头自动选帧',
+    'analyzing': '正在分析镜头...',
+    'auto_selected': '已按镜头选中 {n} 帧',
+    'save_metrics': '保存性能数据',
+    'metrics_saved': '性能数据已保存: ',
     'loaded': '已加载: ',
     'exported': '已导出: ',
     'exported_n': '已导出 {n} 张图片到 ',
     'generating_gif': '正在生成 GIF...',
     'gif_saved': 'GIF 已保存: ',
     'gif_failed': 'GIF 生成失败',
+    'gif_cancelled': 'GIF 导出已取消',
     'no_video': '请先打开视频文件',
     'no_frames': '请先选中要导出的帧',
     'no_frames_gif': '请先选中要导出的帧 (使用空格键选中)',
@@ -71,11 +78,26 @@ LANG_ZH = {
     'general': '通用',
     'loop': '循环次数:',
     'loop_hint': '(0=无限循环)',
+    'engine': 'GIF 引擎:',
+    'engine_pillow': 'Pillow',
+    'engine_ffmpeg': 'FFmpeg 调色板',
+    'dither': '抖动算法:',
+    'stats_mode': '调色板统计:',
+    'diff_rect': '仅重新编码变化区域',
+    'max_kb': '最大体积 (KB):',
+    'max_kb_hint': '(0=不限制)',
+    'gif_fitted': '{w}px, {fps} FPS, 每 {skip} 帧取 1 帧, {colors} 色, 编码 {attempts} 次',
+    'gif_over_limit': '无法压缩到 {kb} KB 以内，已保存最小的结果',
     'cancel': '取消',
     'export': '导出',
     'lang_switch': 'English',
     'marked': '[已选中]',
     'frame_fmt': '帧 {f:5d}  |  {t:.2f}s',
+    'dropped': '播放结束 - 丢帧: {n}',
+    'export_cancelled': '导出已取消，已导出 {n} 张图片',
+    'export_failed': '导出失败: {error}',
+    'progress_fmt': '{done} / {total}  |  剩余 {eta}',
+    'exporting': '正在导出...',
 }
 
 LANG_EN = {
@@ -97,12 +119,19 @@ LANG_EN = {
     'speed': 'Speed:',
     'ready': 'Ready - Please open a video file',
     'loading': 'Loading video...',
+    'indexing': 'Indexing frames... {n}',
+    'auto_select': 'Auto Select Scenes',
+    'analyzing': 'Analyzing scenes...',
+    'auto_selected': 'Selected {n} scene frames',
+    'save_metrics': 'Save metrics',
+    'metrics_saved': 'Metrics saved: ',
     'loaded': 'Loaded: ',
     'exported': 'Exported: ',
     'exported_n': 'Exported {n} images to ',
     'generating_gif': 'Generating GIF...',
     'gif_saved': 'GIF saved: ',
     'gif_failed': 'GIF generation failed',
+    'gif_cancelled': 'GIF export cancelled',
     'no_video': 'Please open a video file first',
     'no_frames': 'Please select frames to export first',
     'no_frames_gif': 'Please select frames first (use Space key)',
@@ -123,11 +152,26 @@ LANG_EN = {
     'general': 'General',
     'loop': 'Loop count:',
     'loop_hint': '(0=infinite)',
+    'engine': 'Engine:',
+    'engine_pillow': 'Pillow',
+    'engine_ffmpeg': 'FFmpeg palette',
+    'dither': 'Dither:',
+    'stats_mode': 'Palette stats:',
+    'diff_rect': 'Re-encode changed area only',
+    'max_kb': 'Max size (KB):',
+    'max_kb_hint': '(0=no limit)',
+    'gif_fitted': '{w}px, {fps} FPS, every {skip} frame(s), {colors} colors, {attempts} encode(s)',
+    'gif_over_limit': 'Could not fit under {kb} KB; saved the smallest result',
     'cancel': 'Cancel',
     'export': 'Export',
     'lang_switch': '中文',
     'marked': '[Selected]',
     'frame_fmt': 'Frame {f:5d}  |  {t:.2f}s',
+    'dropped': 'Playback stopped - dropped frames: {n}',
+    'export_cancelled': 'Export cancelled, {n} images exported',
+    'export_failed': 'Export failed: {error}',
+    'progress_fmt': '{done} / {total}  |  ETA {eta}',
+    'exporting': 'Exporting...',
 }
 
 
@@ -166,214 +210,35 @@ i18n = I18n()
 
 
 # ============================================================
-# FFmpeg Helper
-# ============================================================
-
-class FFmpegHelper:
-    """FFmpeg helper for video decoding"""
-
-    def __init__(self):
-        self.ffmpeg_path = self._find_ffmpeg()
-        self.ffprobe_path = self._find_ffprobe()
-
-    def _find_ffmpeg(self):
-        """Find ffmpeg executable - prioritize local bundled version"""
-        # Priority 1: bundled ffmpeg in ffmpeg/ subfolder
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        local_path = os.path.join(base_dir, 'ffmpeg', 'ffmpeg.exe')
-        if os.path.exists(local_path):
-            return local_path
-
-        # Priority 2: ffmpeg in same directory
-        same_dir = os.path.join(base_dir, 'ffmpeg.exe')
-        if os.path.exists(same_dir):
-            return same_dir
-
-        # Priority 3: system PATH
-        result = shutil.which('ffmpeg')
-        if result:
-            return result
-
-        return 'ffmpeg'
-
-    def _find_ffprobe(self):
-        """Find ffprobe executable - prioritize local bundled version"""
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        local_path = os.path.join(base_dir, 'ffmpeg', 'ffprobe.exe')
-        if os.path.exists(local_path):
-            return local_path
-
-        same_dir = os.path.join(base_dir, 'ffprobe.exe')
-        if os.path.exists(same_dir):
-            return same_dir
-
-        result = shutil.which('ffprobe')
-        if result:
-            return result
-
-        return 'ffprobe'
-
-    def get_video_info(self, video_path):
-        """Get video information"""
-        cmd = [
-            self.ffprobe_path,
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            video_path
-        ]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True,
-                                    creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
-            info = json.loads(result.stdout)
-
-            for stream in info.get('streams', []):
-                if stream.get('codec_type') == 'video':
-                    width = stream.get('width', 0)
-                    height = stream.get('height', 0)
-
-                    # Parse frame rate
-                    fps_str = stream.get('r_frame_rate', '30/1')
-                    if '/' in fps_str:
-                        num, den = map(float, fps_str.split('/'))
-                        fps = num / den if den != 0 else 30
-                    else:
-                        fps = float(fps_str)
-
-                    # Parse total frames
-                    nb_frames = stream.get('nb_frames')
-                    if nb_frames:
-                        total_frames = int(nb_frames)
-                    else:
-                        duration = float(info.get('format', {}).get('duration', 0))
-                        total_frames = int(duration * fps) if duration > 0 else 0
-
-                    return {
-                        'width': width,
-                        'height': height,
-                        'fps': fps,
-                        'total_frames': total_frames,
-                        'duration': float(info.get('format', {}).get('duration', 0))
-                    }
-        except Exception as e:
-            print(f"Failed to get video info: {e}")
-        return None
-
-    def extract_frame(self, video_path, frame_number, fps, output_path):
-        """Extract specific frame"""
-        timestamp = frame_number / fps
-        cmd = [
-            self.ffmpeg_path,
-            '-y',
-            '-ss', str(timestamp),
-            '-i', video_path,
-            '-vframes', '1',
-            '-q:v', '2',
-            output_path
-        ]
-        try:
-            subprocess.run(cmd, capture_output=True,
-                          creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
-            return os.path.exists(output_path)
-        except Exception as e:
-            print(f"Failed to extract frame: {e}")
-            return False
-
-    def create_gif(self, image_paths, output_path, fps=10, width=None, loop=0, optimize=True):
-        """Create GIF animation"""
-        if not image_paths:
-            return False
-
-        images = []
-        for path in image_paths:
-            img = Image.open(path)
-            if width and img.width != width:
-                ratio = width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((width, new_height), Image.Resampling.LANCZOS)
-            if img.mode != 'P':
-                img = img.convert('RGBA')
-            images.append(img)
-
-        if not images:
-            return False
-
-        duration = int(1000 / fps)
-
-        images[0].save(
-            output_path,
-            save_all=True,
-            append_images=images[1:],
-            duration=duration,
-            loop=loop,
-            optimize=optimize
-        )
-        return os.path.exists(output_path)
-
-
-# ============================================================
-# Video Player Core
+# Main Application
 # ============================================================
 
-class VideoPlayer:
-    """Video player core"""
-
-    def __init__(self):
-        self.ffmpeg = FFmpegHelper()
-        self.video_path = None
-        self.video_info = None
-        self.current_frame = 0
-        self.temp_dir = None
-        self.frame_cache = {}
-        self.cache_size = 50
-        self.selected_frames = set()
-
-    def load_video(self, path):
-        """Load video file"""
-        self.video_path = path
-        self.video_info = self.ffmpeg.get_video_info(path)
-        self.current_frame = 0
-        self.frame_cache.clear()
-        self.selected_frames.clear()
-
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-        self.temp_dir = tempfile.mkdtemp(prefix='ronvideo_')
-
-        return self.video_info is not None
-
-    def get_frame_image(self, frame_number):
-        """Get image for specific frame"""
-        if not self.video_info:
-            return None
+def fit_size(width, height, box_w, box_h):
+    """Largest size with the aspect ratio of width x height that fits the box"""
+    if box_w <= 1 or box_h <= 1:
+        return width, height
+    ratio = min(box_w / width, box_h / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def format_metrics(snapshot):
+    """One-line summary of a metrics snapshot for the status bar"""
+    parts = []
+    for stage in ('seek', 'decode', 'preview', 'photo', 'display'):
+        data = snapshot['stages'].get(stage)
+        if data:
+            parts.append(f"{stage} {data['p50_ms']:.1f}/{data['p90_ms']:.1f}ms")
+    cache = snapshot.get('caches', {}).get('preview_cache')
+    if cache:
+        parts.append(f"cache {cache['hit_ratio'] * 100:.0f}%")
+    gauges = snapshot['gauges']
+    if 'playback_fps' in gauges:
+        parts.append(f"{gauges['playback_fps']:.1f}/{gauges['playback_target_fps']:.0f} FPS")
+    dropped = snapshot['counters'].get('dropped_frames')
+    if dropped:
+        parts.append(f"drop {dropped}")
+    return ' | '.join(parts)
 
-        if frame_number in self.frame_cache:
-            return self.frame_cache[frame_number]
-
-        temp_path = os.path.join(self.temp_dir, f'temp_{frame_number}.png')
-        if self.ffmpeg.extract_frame(self.video_path, frame_number,
-                                      self.video_info['fps'], temp_path):
-            img = Image.open(temp_path)
-
-            if len(self.frame_cache) >= self.cache_size:
-                oldest = min(self.frame_cache.keys())
-                del self.frame_cache[oldest]
-
-            self.frame_cache[frame_number] = img.copy()
-            return self.frame_cache[frame_number]
-
-        return None
-
-    def cleanup(self):
-        """Clean up temp files"""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-
-
-# ============================================================
-# Main Application
-# ============================================================
 
 class RonVideo2PicApp:
     """Main application"""
@@ -390,6 +255,27 @@ class RonVideo2PicApp:
         self.playing = False
         self.play_speed = 1.0
         self.photo_image = None
+        self.resize_job = None
+        self.marked_shown = False
+        self.scrub_target = None
+        self.scrub_shown = None
+        self.scrub_poll_job = None
+        self.scrub_settle_job = None
+        self.scrub_settle_ms = 150
+        self.prefetch_seconds = 1.0
+        self.export_workers = None
+        self.play_start_time = 0
+        self.play_start_frame = 0
+        self.dropped_frames = 0
+        self.played_frames = 0
+        self.load_cancel = None
+        self.metrics_visible = False
+        self.filmstrip = None
+        self.filmstrip_view = None
+        self.filmstrip_photo = None
+        self.filmstrip_tiles = []
+        self.filmstrip_job = None
+        self.selection_anchor = None
 
         self.create_ui()
         self.bind_shortcuts()
@@ -430,6 +316,10 @@ class RonVideo2PicApp:
                        background=self.colors['bg'],
                        foreground=self.colors['text'])
 
+        style.configure('TRadiobutton',
+                       background=self.colors['bg'],
+                       foreground=self.colors['text'])
+
         style.configure('TSpinbox',
                        fieldbackground=self.colors['bg_light'],
                        foreground=self.colors['text'])
@@ -490,7 +380,14 @@ class RonVideo2PicApp:
                                fill=self.colors['text_dim'], font=('Microsoft YaHei', 14),
                                tags='hint')
 
+        # One persistent image item and overlay; frames are pasted into them
+        self.canvas_image = self.canvas.create_image(0, 0, anchor=tk.CENTER)
+        self.marked_item = self.canvas.create_text(10, 10, text=i18n.get('marked'),
+                                                   fill=self.colors['highlight'], anchor=tk.NW,
+                                                   font=('Microsoft YaHei', 10, 'bold'), state=tk.HIDDEN)
+
         self.canvas.bind('<Button-1>', self.on_canvas_click)
+        self.canvas.bind('<Configure>', self.on_canvas_resize)
 
     def create_sidebar(self, parent):
         """Create sidebar"""
@@ -504,22 +401,16 @@ class RonVideo2PicApp:
         list_frame = ttk.Frame(sidebar)
         list_frame.pack(fill=tk.BOTH, expand=True)
 
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self.frame_listbox = tk.Listbox(list_frame, bg=self.colors['bg_light'],
-                                        fg=self.colors['text'],
-                                        selectbackground=self.colors['highlight'],
-                                        font=('Consolas', 10),
-                                        yscrollcommand=scrollbar.set)
-        self.frame_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.frame_listbox.yview)
-
-        self.frame_listbox.bind('<Double-1>', self.goto_selected_frame)
+        self.frame_list = FrameListView(list_frame, self.colors,
+                                        source=lambda: self.player.selected_frames if self.player.video_info else None,
+                                        format_row=self.frame_row_text, on_activate=self.display_frame)
 
         btn_frame = ttk.Frame(sidebar)
         btn_frame.pack(fill=tk.X, pady=10)
 
+        self.btn_auto_select = ttk.Button(btn_frame, text=i18n.get('auto_select'), command=self.auto_select_frames)
+        self.btn_auto_select.pack(fill=tk.X, pady=2)
+
         self.btn_remove = ttk.Button(btn_frame, text=i18n.get('remove'), command=self.remove_selected_frame)
         self.btn_remove.pack(fill=tk.X, pady=2)
 
@@ -539,10 +430,24 @@ class RonVideo2PicApp:
                                       variable=self.frame_var, orient=tk.HORIZONTAL,
                                       command=self.on_slider_change)
         self.frame_slider.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.frame_slider.bind('<ButtonRelease-1>', self.finish_scrub)
 
         self.frame_label = ttk.Label(slider_frame, text="0 / 0", width=15)
         self.frame_label.pack(side=tk.RIGHT, padx=(10, 0))
 
+        # Keyframe thumbnails: click to jump, wheel to zoom, Shift+wheel to pan
+        self.filmstrip_canvas = tk.Canvas(controls, height=self.player.filmstrip_height,
+                                          bg=self.colors['bg_light'], highlightthickness=0)
+        self.filmstrip_canvas.pack(fill=tk.X, pady=(0, 10))
+        self.filmstrip_item = self.filmstrip_canvas.create_image(0, 0, anchor=tk.NW)
+        self.filmstrip_playhead = self.filmstrip_canvas.create_line(
+            0, 0, 0, self.player.filmstrip_height, fill=self.colors['highlight'], width=2, state=tk.HIDDEN)
+        self.filmstrip_canvas.bind('<Button-1>', self.on_filmstrip_click)
+        self.filmstrip_canvas.bind('<Configure>', self.on_filmstrip_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.filmstrip_canvas.bind(sequence, lambda e: self.on_filmstrip_wheel(e, zoom=True))
+            self.filmstrip_canvas.bind('<Shift-' + sequence[1:], lambda e: self.on_filmstrip_wheel(e, zoom=False))
+
         play_frame = ttk.Frame(controls)
         play_frame.pack()
 
@@ -591,6 +496,11 @@ class RonVideo2PicApp:
                               foreground=self.colors['text_dim'])
         self.info_label.pack(side=tk.RIGHT)
 
+        # Metrics panel, toggled with F3
+        self.metrics_var = tk.StringVar(value="")
+        self.metrics_label = ttk.Label(statusbar, textvariable=self.metrics_var,
+                                       foreground=self.colors['highlight'])
+
     def toggle_language(self):
         """Toggle language between Chinese and English"""
         i18n.toggle()
@@ -606,6 +516,7 @@ class RonVideo2PicApp:
         self.btn_gif.config(text=i18n.get('export_gif'))
         self.btn_lang.config(text=i18n.get('lang_switch'))
         self.sidebar_title.config(text=i18n.get('selected_frames'))
+        self.btn_auto_select.config(text=i18n.get('auto_select'))
         self.btn_remove.config(text=i18n.get('remove'))
         self.btn_clear.config(text=i18n.get('clear_all'))
         self.btn_prev.config(text=i18n.get('prev_frame'))
@@ -617,6 +528,8 @@ class RonVideo2PicApp:
         else:
             self.play_btn_text.set(i18n.get('play'))
 
+        self.canvas.itemconfigure(self.marked_item, text=i18n.get('marked'))
+
         if not self.player.video_path:
             self.status_var.set(i18n.get('ready'))
             self.canvas.delete('hint')
@@ -631,12 +544,15 @@ class RonVideo2PicApp:
         self.root.bind('<Left>', lambda e: self.prev_frame())
         self.root.bind('<Right>', lambda e: self.next_frame())
         self.root.bind('<space>', lambda e: self.toggle_current_frame())
+        self.root.bind('<Shift-space>', lambda e: self.select_span())
         self.root.bind('<Return>', lambda e: self.toggle_play())
         self.root.bind('<Home>', lambda e: self.goto_frame(0))
         self.root.bind('<End>', lambda e: self.goto_frame(self.get_total_frames() - 1))
         self.root.bind('<Control-o>', lambda e: self.open_video())
         self.root.bind('<Control-s>', lambda e: self.export_current_frame())
         self.root.bind('<Control-g>', lambda e: self.export_gif())
+        self.root.bind('<F3>', lambda e: self.toggle_metrics())
+        self.root.bind('<F4>', lambda e: self.save_metrics())
 
     def open_video(self):
         """Open video file"""
@@ -649,26 +565,110 @@ class RonVideo2PicApp:
             self.load_video(path)
 
     def load_video(self, path):
-        """Load video"""
+        """Load video: probe, first frame and frame index run in the background"""
+        self.stop_playback()
+        if self.load_cancel:
+            self.load_cancel.set()
+        cancel = self.load_cancel = threading.Event()
+
+        self.player.close_video()
+        self.selection_anchor = None
+        self.frame_list.reset()
+        self.clear_filmstrip()
+        self.info_var.set("")
         self.status_var.set(i18n.get('loading'))
-        self.root.update()
+        canvas_w = self.canvas.winfo_width()
+        canvas_h = self.canvas.winfo_height()
+        result = {}
+
+        def probe():
+            probed = self.player.probe(path)
+            info = probed[1]
+            if info and not cancel.is_set():
+                # Decode the first frame here too so the UI thread only has to show it
+                size = fit_size(info['width'], info['height'], canvas_w, canvas_h)
+                decoder = self.player.ffmpeg.open_decoder(path, info, probed[2], size)
+                try:
+                    result['first_frame'] = (size, decoder.read_frame(0))
+                finally:
+                    decoder.close()
+            result['probed'] = probed
+
+        worker = threading.Thread(target=probe, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                self.root.after(50, poll)
+                return
+            if cancel.is_set():
+                # Another video was opened meanwhile; nothing else will close this entry
+                video_cache = result.get('probed', (None,))[0]
+                if video_cache:
+                    video_cache.close()
+                return
+            self.on_video_probed(path, result, cancel)
+
+        poll()
+
+    def on_video_probed(self, path, result, cancel):
+        """Show the first frame, then build the frame index if it is not cached"""
+        if not self.player.open_video(path, result['probed']):
+            messagebox.showerror("Error", i18n.get('load_failed'))
+            return
 
-        if self.player.load_video(path):
-            info = self.player.video_info
-            total = info['total_frames']
+        size, img = result.get('first_frame', (None, None))
+        if img:
+            self.player.set_preview_size(size)
+            self.player.preview_cache.put(0, img)
 
-            self.frame_slider.configure(to=max(1, total - 1))
-            self.frame_var.set(0)
+        self.show_video_info()
+        self.frame_var.set(0)
+        self.status_var.set(i18n.get('loaded') + os.path.basename(path))
+        self.canvas.delete('hint')
+        self.display_frame(0)
 
-            self.info_var.set(f"{info['width']}x{info['height']} | {info['fps']:.2f} FPS | {total} frames")
-            self.status_var.set(i18n.get('loaded') + os.path.basename(path))
+        if self.player.frame_index:
+            self.load_filmstrip(cancel)
+        else:
+            self.build_index(path, cancel)
+
+    def build_index(self, path, cancel):
+        """Scan the frame index in the background and switch to it when done"""
+        start_time = self.player.video_info['start_time']
+        progress = {'count': 0}
+        result = {}
+
+        def work():
+            result['index'] = self.player.ffmpeg.build_frame_index(
+                path, start_time, progress=lambda n: progress.update(count=n), cancel_event=cancel)
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if cancel.is_set():
+                return
+            if worker.is_alive():
+                self.show_video_info(i18n.get('indexing').format(n=progress['count']))
+                self.root.after(200, poll)
+                return
+            self.player.set_frame_index(result.get('index'))
+            self.show_video_info()
+            self.display_frame(self.player.current_frame)
+            self.load_filmstrip(cancel)
 
-            self.canvas.delete('hint')
+        poll()
 
-            self.display_frame(0)
-        else:
-            messagebox.showerror("Error", i18n.get('load_failed'))
+    def show_video_info(self, extra=None):
+        """Update the info label and slider range from the current video"""
+        info = self.player.video_info
+        total = info['total_frames']
+        self.frame_slider.configure(to=max(1, total - 1))
+        text = f"{info['width']}x{info['height']} | {info['fps']:.2f} FPS | {total} frames"
+        self.info_var.set(f"{text} | {extra}" if extra else text)
 
+    @metrics.timed('display')
     def display_frame(self, frame_number):
         """Display specific frame"""
         if not self.player.video_info:
@@ -677,40 +677,208 @@ class RonVideo2PicApp:
         total = self.player.video_info['total_frames']
         frame_number = max(0, min(frame_number, total - 1))
 
-        img = self.player.get_frame_image(frame_number)
+        frame_number, img = self.player.get_display_image(frame_number, self.preview_size())
         if img:
-            canvas_w = self.canvas.winfo_width()
-            canvas_h = self.canvas.winfo_height()
-
-            if canvas_w > 1 and canvas_h > 1:
-                ratio = min(canvas_w / img.width, canvas_h / img.height)
-                new_w = int(img.width * ratio)
-                new_h = int(img.height * ratio)
-                img_resized = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-            else:
-                img_resized = img
-
-            self.photo_image = ImageTk.PhotoImage(img_resized)
-
-            self.canvas.delete('all')
-            self.canvas.create_image(canvas_w // 2, canvas_h // 2,
-                                    image=self.photo_image, anchor=tk.CENTER)
-
-            if frame_number in self.player.selected_frames:
-                self.canvas.create_text(10, 10, text=i18n.get('marked'),
-                                        fill=self.colors['highlight'],
-                                        anchor=tk.NW, font=('Microsoft YaHei', 10, 'bold'))
+            with metrics.timed('photo'):
+                self.show_image(img)
+            self.update_marked_overlay(frame_number)
 
         self.player.current_frame = frame_number
         self.frame_label.config(text=f"{frame_number + 1} / {total}")
+        self.update_filmstrip_playhead(frame_number)
 
         self.frame_slider.set(frame_number)
 
+    def show_image(self, img):
+        """Paste a frame into the persistent PhotoImage; a new one is made only on size change"""
+        photo = self.photo_image
+        if photo is None or (photo.width(), photo.height()) != img.size:
+            self.photo_image = ImageTk.PhotoImage(img)
+            self.canvas.itemconfigure(self.canvas_image, image=self.photo_image)
+        else:
+            photo.paste(img)
+
+    def update_marked_overlay(self, frame_number):
+        """Show the selected marker only while a selected frame is displayed"""
+        marked = frame_number in self.player.selected_frames
+        if marked != self.marked_shown:
+            self.marked_shown = marked
+            self.canvas.itemconfigure(self.marked_item, state=tk.NORMAL if marked else tk.HIDDEN)
+
+    def on_canvas_resize(self, event):
+        """Keep the frame centred; re-decode at the new size once resizing settles"""
+        self.canvas.coords(self.canvas_image, event.width // 2, event.height // 2)
+        if self.resize_job:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(100, self.on_resize_done)
+
+    def on_resize_done(self):
+        self.resize_job = None
+        if self.player.video_info and not self.playing:
+            self.display_frame(self.player.current_frame)
+
+    def preview_size(self):
+        """Size of the video scaled to fit the canvas"""
+        info = self.player.video_info
+        return fit_size(info['width'], info['height'],
+                        self.canvas.winfo_width(), self.canvas.winfo_height())
+
     def on_slider_change(self, value):
-        """Slider change callback"""
+        """Slider change callback.
+
+        Only records the target: a low-res keyframe preview is decoded in
+        the background (newer targets supersede older ones) and the exact
+        frame is shown once the slider rests for scrub_settle_ms.
+        """
         frame = int(float(value))
-        if frame != self.player.current_frame:
-            self.display_frame(frame)
+        if not self.player.video_info or frame == self.scrub_target:
+            return
+        if self.scrub_target is None and frame == self.player.current_frame:
+            # Echo of display_frame moving the slider
+            return
+
+        self.scrub_target = frame
+        preview = self.player.scrub_preview(frame, self.preview_size())
+        if preview and preview[0] != self.scrub_shown:
+            self.show_scrub_preview(*preview)
+        if not self.scrub_poll_job:
+            self.scrub_poll_job = self.root.after(15, self.poll_scrub)
+        if self.scrub_settle_job:
+            self.root.after_cancel(self.scrub_settle_job)
+        self.scrub_settle_job = self.root.after(self.scrub_settle_ms, self.finish_scrub)
+
+    def poll_scrub(self):
+        """Show background scrubbing previews as they finish"""
+        self.scrub_poll_job = None
+        if self.scrub_target is None:
+            return
+        preview = self.player.take_scrub_preview()
+        if preview and preview[0] != self.scrub_shown:
+            self.show_scrub_preview(*preview)
+        self.scrub_poll_job = self.root.after(15, self.poll_scrub)
+
+    def show_scrub_preview(self, frame, img):
+        """Paint a scrubbing preview without making it the current frame"""
+        self.scrub_shown = frame
+        self.show_image(img)
+        self.update_marked_overlay(frame)
+        self.frame_label.config(text=f"{frame + 1} / {self.get_total_frames()}")
+        self.update_filmstrip_playhead(frame)
+
+    def finish_scrub(self, event=None):
+        """Show the exact frame under the slider once dragging pauses or ends"""
+        if self.scrub_settle_job:
+            self.root.after_cancel(self.scrub_settle_job)
+            self.scrub_settle_job = None
+        target, self.scrub_target = self.scrub_target, None
+        self.scrub_shown = None
+        if target is not None and self.player.video_info:
+            self.display_frame(target)
+
+    def load_filmstrip(self, cancel):
+        """Load or build the keyframe filmstrip in the background"""
+        result = {}
+
+        def work():
+            result['filmstrip'] = self.player.load_filmstrip(cancel_event=cancel)
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if cancel.is_set():
+                return
+            if worker.is_alive():
+                self.root.after(200, poll)
+                return
+            self.filmstrip = result.get('filmstrip')
+            if self.filmstrip:
+                self.filmstrip_view = (0.0, self.player.video_info['duration'] or self.filmstrip.times[-1])
+                self.render_filmstrip()
+
+        poll()
+
+    def clear_filmstrip(self):
+        self.filmstrip = None
+        self.filmstrip_tiles = []
+        self.filmstrip_canvas.itemconfigure(self.filmstrip_item, image='')
+        self.filmstrip_canvas.itemconfigure(self.filmstrip_playhead, state=tk.HIDDEN)
+        self.filmstrip_photo = None
+
+    def render_filmstrip(self):
+        """Draw the thumbnails of the visible time range only"""
+        self.filmstrip_job = None
+        width = self.filmstrip_canvas.winfo_width()
+        if not self.filmstrip or width <= 1:
+            return
+        img, self.filmstrip_tiles = self.filmstrip.render(*self.filmstrip_view, width)
+        photo = self.filmstrip_photo
+        if photo is None or (photo.width(), photo.height()) != img.size:
+            self.filmstrip_photo = ImageTk.PhotoImage(img)
+            self.filmstrip_canvas.itemconfigure(self.filmstrip_item, image=self.filmstrip_photo)
+        else:
+            photo.paste(img)
+        self.update_filmstrip_playhead(self.scrub_shown if self.scrub_shown is not None
+                                       else self.player.current_frame, follow=False)
+
+    def update_filmstrip_playhead(self, frame_number, follow=True):
+        """Move the playhead marker, scrolling a zoomed-in strip to keep it visible"""
+        if not self.filmstrip:
+            return
+        start, end = self.filmstrip_view
+        t = max(0.0, min(self.player.frame_time(frame_number), self.filmstrip_duration()))
+        if not start <= t <= end:
+            if follow:
+                span = end - start
+                start = max(0.0, min(t - span / 2, self.filmstrip_duration() - span))
+                self.filmstrip_view = (start, start + span)
+                self.render_filmstrip()
+            else:
+                self.filmstrip_canvas.itemconfigure(self.filmstrip_playhead, state=tk.HIDDEN)
+            return
+        x = (t - start) / max(end - start, 1e-6) * self.filmstrip_canvas.winfo_width()
+        self.filmstrip_canvas.coords(self.filmstrip_playhead, x, 0, x, self.player.filmstrip_height)
+        self.filmstrip_canvas.itemconfigure(self.filmstrip_playhead, state=tk.NORMAL)
+
+    def filmstrip_duration(self):
+        return self.player.video_info['duration'] or self.filmstrip.times[-1]
+
+    def on_filmstrip_click(self, event):
+        """Jump to the keyframe of the clicked thumbnail"""
+        if not self.filmstrip_tiles:
+            return
+        slot = min(event.x // self.filmstrip.tile_size[0], len(self.filmstrip_tiles) - 1)
+        tile = self.filmstrip_tiles[max(0, slot)]
+        self.stop_playback()
+        self.display_frame(self.player.frame_at_time(self.filmstrip.times[tile]))
+
+    def on_filmstrip_wheel(self, event, zoom):
+        """Zoom around the pointer, or pan the visible range"""
+        if not self.filmstrip:
+            return
+        step = 1 if event.num == 4 or getattr(event, 'delta', 0) > 0 else -1
+        start, end = self.filmstrip_view
+        span = end - start
+        duration = self.filmstrip_duration()
+        width = max(1, self.filmstrip_canvas.winfo_width())
+        if zoom:
+            # Zoom in no further than one distinct keyframe per thumbnail slot
+            slots = max(1, width // self.filmstrip.tile_size[0])
+            min_span = min(duration, duration / len(self.filmstrip) * slots)
+            pivot = start + event.x / width * span
+            new_span = max(min_span, min(duration, span * (0.8 if step > 0 else 1.25)))
+            start = pivot - (pivot - start) * new_span / span
+            span = new_span
+        else:
+            start -= step * span / 4
+        start = max(0.0, min(start, duration - span))
+        self.filmstrip_view = (start, start + span)
+        self.render_filmstrip()
+
+    def on_filmstrip_resize(self, event):
+        if self.filmstrip_job:
+            self.root.after_cancel(self.filmstrip_job)
+        self.filmstrip_job = self.root.after(100, self.render_filmstrip)
 
     def on_canvas_click(self, event):
         """Canvas click handler"""
@@ -720,10 +888,22 @@ class RonVideo2PicApp:
     def prev_frame(self):
         """Previous frame"""
         self.display_frame(self.player.current_frame - 1)
+        self.prefetch_ahead(-1)
 
     def next_frame(self):
         """Next frame"""
         self.display_frame(self.player.current_frame + 1)
+        self.prefetch_ahead(1)
+
+    def prefetch_ahead(self, direction, start=None):
+        """Queue background decoding of the frames after the playhead"""
+        if not self.player.video_info:
+            return
+        if start is None:
+            start = self.player.current_frame + direction
+        fps = self.player.video_info['fps']
+        count = max(8, int(fps * self.play_speed * self.prefetch_seconds))
+        self.player.prefetch(start, direction, count)
 
     def jump_frames(self, delta):
         """Jump multiple frames"""
@@ -748,24 +928,61 @@ class RonVideo2PicApp:
         self.play_btn_text.set(i18n.get('pause') if self.playing else i18n.get('play'))
 
         if self.playing:
+            self.play_start_time = time.perf_counter()
+            self.play_start_frame = self.player.current_frame
+            self.dropped_frames = 0
+            self.played_frames = 0
+            self.prefetch_ahead(1)
             self.play_loop()
+        else:
+            self.stop_playback()
+
+    def stop_playback(self):
+        """Stop playback and report dropped frames if it was playing"""
+        was_playing = self.playing
+        self.playing = False
+        self.play_btn_text.set(i18n.get('play'))
+        if was_playing:
+            self.status_var.set(i18n.get('dropped').format(n=self.dropped_frames))
 
     def play_loop(self):
-        """Playback loop"""
+        """Playback loop.
+
+        The frame to show is derived from the wall clock. Only frames the
+        prefetcher has already decoded are displayed; if decoding falls
+        behind, frames are skipped instead of blocking the UI.
+        """
         if not self.playing:
             return
 
-        if self.player.current_frame < self.get_total_frames() - 1:
-            self.next_frame()
+        total = self.get_total_frames()
+        fps = self.player.video_info['fps']
+        elapsed = time.perf_counter() - self.play_start_time
+        target = self.play_start_frame + int(elapsed * fps * self.play_speed)
+
+        current = self.player.current_frame
+        if target > current:
+            last = min(target, total - 1)
+            frame = self.player.find_cached_frame(current + 1, last)
+            if frame is not None:
+                self.dropped_frames += frame - current - 1
+                metrics.count('dropped_frames', frame - current - 1)
+                self.display_frame(frame)
+                self.played_frames += 1
+            self.prefetch_ahead(1, start=last)
+
+        if elapsed > 0:
+            metrics.gauge('playback_fps', round(self.played_frames / elapsed, 2))
+            metrics.gauge('playback_target_fps', round(fps * self.play_speed, 2))
+
+        # Stop at the end, or once the clock is well past it (estimated frame count too high)
+        if self.player.current_frame >= total - 1 or target > total + fps * self.play_speed:
+            self.stop_playback()
+            return
 
-            fps = self.player.video_info['fps']
-            delay = int(1000 / (fps * self.play_speed))
-            delay = max(10, delay)
-
-            self.root.after(delay, self.play_loop)
-        else:
-            self.playing = False
-            self.play_btn_text.set(i18n.get('play'))
+        delay = int(1000 / (fps * self.play_speed))
+        delay = max(10, delay)
+        self.root.after(delay, self.play_loop)
 
     def set_speed(self, speed_str):
         """Set playback speed"""
@@ -778,47 +995,82 @@ class RonVideo2PicApp:
             return
 
         frame = self.player.current_frame
-        if frame in self.player.selected_frames:
-            self.player.selected_frames.remove(frame)
-        else:
-            self.player.selected_frames.add(frame)
+        self.player.selected_frames.toggle(frame)
+        self.selection_anchor = frame
 
         self.update_frame_list()
-        self.display_frame(frame)
+        self.update_marked_overlay(frame)
 
-    def update_frame_list(self):
-        """Update selected frames list"""
-        self.frame_listbox.delete(0, tk.END)
+    def select_span(self):
+        """Select every frame between the last toggled frame and the current one"""
         if not self.player.video_info:
             return
-        for frame in sorted(self.player.selected_frames):
-            time_sec = frame / self.player.video_info['fps']
-            text = i18n.get('frame_fmt').format(f=frame + 1, t=time_sec)
-            self.frame_listbox.insert(tk.END, text)
-
-    def goto_selected_frame(self, event):
-        """Go to frame selected in list"""
-        selection = self.frame_listbox.curselection()
-        if selection:
-            frames = sorted(self.player.selected_frames)
-            frame = frames[selection[0]]
-            self.display_frame(frame)
+        if self.selection_anchor is None:
+            self.toggle_current_frame()
+            return
+
+        frame = self.player.current_frame
+        first, last = sorted((self.selection_anchor, frame))
+        self.player.selected_frames.add_range(first, last + 1)
+        self.selection_anchor = frame
+
+        self.frame_list.show(frame)
+        self.update_marked_overlay(frame)
+
+    def frame_row_text(self, frame):
+        return i18n.get('frame_fmt').format(f=frame + 1, t=self.player.frame_time(frame))
+
+    def update_frame_list(self):
+        """Update selected frames list"""
+        self.frame_list.refresh()
 
     def remove_selected_frame(self):
-        """Remove frame from selection"""
-        selection = self.frame_listbox.curselection()
-        if selection:
-            frames = sorted(self.player.selected_frames)
-            frame = frames[selection[0]]
-            self.player.selected_frames.discard(frame)
+        """Remove the marked frames from the selection"""
+        marked = self.frame_list.take_marked()
+        if marked:
+            self.player.selected_frames.discard_range(marked[0], marked[1] + 1)
             self.update_frame_list()
-            self.display_frame(self.player.current_frame)
+            self.update_marked_overlay(self.player.current_frame)
 
     def clear_selected_frames(self):
         """Clear all selected frames"""
         self.player.selected_frames.clear()
-        self.update_frame_list()
-        self.display_frame(self.player.current_frame)
+        self.selection_anchor = None
+        self.frame_list.reset()
+        self.update_marked_overlay(self.player.current_frame)
+
+    def auto_select_frames(self):
+        """Select the first frame of every shot, skipping shots that repeat earlier ones"""
+        if not self.player.video_info:
+            messagebox.showwarning("Warning", i18n.get('no_video'))
+            return
+
+        player = self.player
+        info = player.video_info
+        dialog = ProgressDialog(self.root, self.colors, i18n.get('analyzing'), info['total_frames'])
+        result = {}
+
+        def work():
+            result['analysis'] = player.load_scenes(progress=dialog.report, cancel_event=dialog.cancel_event)
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                dialog.refresh()
+                self.root.after(100, poll)
+                return
+            dialog.close()
+            analysis = result.get('analysis')
+            if not analysis or player.video_info is not info:
+                return
+            frames = player.select_scenes(analysis)
+            self.update_frame_list()
+            self.update_marked_overlay(player.current_frame)
+            self.status_var.set(i18n.get('auto_selected').format(n=len(frames)))
+
+        poll()
 
     def export_current_frame(self):
         """Export current frame"""
@@ -847,67 +1099,331 @@ class RonVideo2PicApp:
 
         folder = filedialog.askdirectory(title=i18n.get('select_folder'))
         if folder:
-            count = 0
-            for frame in sorted(self.player.selected_frames):
-                img = self.player.get_frame_image(frame)
-                if img:
-                    path = os.path.join(folder, f"frame_{frame + 1:06d}.png")
-                    img.save(path)
-                    count += 1
+            frames = sorted(self.player.selected_frames)
+            exporter = self.player.create_exporter(self.export_workers)
+            dialog = ProgressDialog(self.root, self.colors, i18n.get('exporting'), len(frames))
+            result = {}
+
+            def work():
+                try:
+                    result['count'] = exporter.export(frames, folder, progress=dialog.report,
+                                                      cancel_event=dialog.cancel_event)
+                except Exception as e:
+                    print(f"Failed to export frames: {e}")
+                    result['error'] = e
+
+            worker = threading.Thread(target=work, daemon=True)
+            worker.start()
+
+            def poll():
+                if worker.is_alive():
+                    dialog.refresh()
+                    self.root.after(100, poll)
+                    return
+                dialog.close()
+                count = result.get('count', 0)
+                if 'error' in result:
+                    messagebox.showerror("Error", i18n.get('export_failed').format(error=result['error']))
+                elif dialog.cancel_event.is_set():
+                    self.status_var.set(i18n.get('export_cancelled').format(n=count))
+                else:
+                    self.status_var.set(i18n.get('exported_n').format(n=count) + folder)
 
-            self.status_var.set(i18n.get('exported_n').format(n=count) + folder)
+            poll()
 
     def export_gif(self):
-        """Export GIF"""
+        """Export GIF; frames are decoded and encoded in the background"""
         if not self.player.selected_frames:
             messagebox.showwarning("Warning", i18n.get('no_frames_gif'))
             return
 
         dialog = GifExportDialog(self.root, self.colors, len(self.player.selected_frames))
-        if dialog.result:
-            path = filedialog.asksaveasfilename(
-                title=i18n.get('save_gif'),
-                defaultextension=".gif",
-                filetypes=[("GIF", "*.gif")],
-                initialfile="output.gif"
-            )
-
-            if path:
-                self.status_var.set(i18n.get('generating_gif'))
-                self.root.update()
-
-                image_paths = []
-                temp_dir = tempfile.mkdtemp(prefix='gif_export_')
-
-                for i, frame in enumerate(sorted(self.player.selected_frames)):
-                    img = self.player.get_frame_image(frame)
-                    if img:
-                        temp_path = os.path.join(temp_dir, f'{i:04d}.png')
-                        img.save(temp_path)
-                        image_paths.append(temp_path)
-
-                success = self.player.ffmpeg.create_gif(
-                    image_paths, path,
-                    fps=dialog.result['fps'],
-                    width=dialog.result['width'],
-                    loop=dialog.result['loop']
+        if not dialog.result:
+            return
+        path = filedialog.asksaveasfilename(
+            title=i18n.get('save_gif'),
+            defaultextension=".gif",
+            filetypes=[("GIF", "*.gif")],
+            initialfile="output.gif"
+        )
+        if not path:
+            return
+
+        options = dialog.result
+        self.status_var.set(i18n.get('generating_gif'))
+        if options['max_kb']:
+            self.export_gif_fitted(path, options)
+            return
+
+        player = self.player
+        selected = sorted(player.selected_frames)
+        width = options['width']
+        info = player.video_info
+        size = (width, int(info['height'] * width / info['width']))
+        progress = ProgressDialog(self.root, self.colors, i18n.get('generating_gif'), len(selected))
+        result = {}
+
+        def work():
+            frames = player.iter_frames(selected, size=size, scale_flags='lanczos')
+            frames = report_frames(frames, len(selected), progress.report, progress.cancel_event)
+            if options['engine'] == 'ffmpeg':
+                result['success'] = player.ffmpeg.create_gif_palette(
+                    frames, path,
+                    fps=options['fps'],
+                    width=width,
+                    loop=options['loop'],
+                    stats_mode=options['stats_mode'],
+                    dither=options['dither'],
+                    diff_rect=options['diff_rect']
+                )
+            else:
+                result['success'] = player.ffmpeg.create_gif(
+                    frames, path,
+                    fps=options['fps'],
+                    width=width,
+                    loop=options['loop']
                 )
 
-                shutil.rmtree(temp_dir, ignore_errors=True)
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                progress.refresh()
+                self.root.after(100, poll)
+                return
+            progress.close()
+            if progress.cancel_event.is_set():
+                self.discard_gif(path)
+            elif result.get('success'):
+                size_kb = os.path.getsize(path) / 1024
+                self.status_var.set(f"{i18n.get('gif_saved')}{os.path.basename(path)} ({size_kb:.1f} KB)")
+            else:
+                messagebox.showerror("Error", i18n.get('gif_failed'))
+
+        poll()
+
+    def export_gif_fitted(self, path, options):
+        """Export a GIF under a size limit, searching width, frame skip and palette size"""
+        fitter = GifSizeFitter(self.player, self.player.selected_frames, options['width'],
+                               options['fps'], options['max_kb'], loop=options['loop'])
+        progress = ProgressDialog(self.root, self.colors, i18n.get('generating_gif'),
+                                  len(self.player.selected_frames))
+        state = {}
+
+        def work():
+            state['result'] = fitter.fit(path, progress=progress.report, cancel_event=progress.cancel_event)
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                progress.refresh()
+                self.root.after(100, poll)
+                return
+            progress.close()
+            if progress.cancel_event.is_set():
+                self.discard_gif(path)
+                return
+            result = state.get('result')
+            if not result:
+                messagebox.showerror("Error", i18n.get('gif_failed'))
+                return
+
+            params = i18n.get('gif_fitted').format(w=result['width'], fps=result['fps'], skip=result['skip'],
+                                                   colors=result['colors'], attempts=result['attempts'])
+            self.status_var.set(f"{i18n.get('gif_saved')}{os.path.basename(path)} "
+                                f"({result['size_kb']:.1f} KB) - {params}")
+            if not result['fits']:
+                messagebox.showwarning("Warning", i18n.get('gif_over_limit').format(kb=options['max_kb']))
+
+        poll()
+
+    def discard_gif(self, path):
+        """Remove a GIF whose export was cancelled part way"""
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Failed to remove partial GIF: {e}")
+        self.status_var.set(i18n.get('gif_cancelled'))
+
+    def toggle_metrics(self):
+        """Show or hide the metrics panel in the status bar"""
+        self.metrics_visible = not self.metrics_visible
+        if self.metrics_visible:
+            self.metrics_label.pack(side=tk.RIGHT, padx=10)
+            self.refresh_metrics()
+        else:
+            self.metrics_label.pack_forget()
 
-                if success:
-                    size_kb = os.path.getsize(path) / 1024
-                    self.status_var.set(f"{i18n.get('gif_saved')}{os.path.basename(path)} ({size_kb:.1f} KB)")
-                else:
-                    messagebox.showerror("Error", i18n.get('gif_failed'))
+    def refresh_metrics(self):
+        """Redraw the metrics panel twice a second while it is visible"""
+        if not self.metrics_visible:
+            return
+        self.metrics_var.set(format_metrics(self.player.metrics_snapshot()))
+        self.root.after(500, self.refresh_metrics)
+
+    def save_metrics(self):
+        """Dump metrics to JSON plus a Chrome trace next to it"""
+        path = filedialog.asksaveasfilename(
+            title=i18n.get('save_metrics'),
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")],
+            initialfile="ronvideo2pic_metrics.json"
+        )
+        if path:
+            trace_path = os.path.splitext(path)[0] + '.trace.json'
+            metrics.dump_json(path, caches=self.player.cache_stats())
+            metrics.dump_trace(trace_path)
+            self.status_var.set(i18n.get('metrics_saved') +
+                                f"{os.path.basename(path)}, {os.path.basename(trace_path)}")
 
     def on_close(self):
         """Close application"""
         self.playing = False
+        if self.load_cancel:
+            self.load_cancel.set()
         self.player.cleanup()
         self.root.destroy()
 
 
+# ============================================================
+# Selected Frame List
+# ============================================================
+
+class FrameListView:
+    """Virtualized list of the selected frames.
+
+    The Listbox only holds the rows that fit on screen and is refilled from
+    the selection when it scrolls or changes, so a refresh costs the same
+    with ten selected frames or ten thousand. Click marks a row, Shift-click
+    marks the span of rows from the last click.
+    """
+
+    def __init__(self, parent, colors, source, format_row, on_activate):
+        self.source = source
+        self.format_row = format_row
+        self.on_activate = on_activate
+        self.top = 0
+        self.rows = 1
+        self.shown = []
+        self.anchor = None
+        self.marked = None  # (first, last) frame of the marked rows
+
+        self.scrollbar = ttk.Scrollbar(parent, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox = tk.Listbox(parent, bg=colors['bg_light'],
+                                  fg=colors['text'],
+                                  selectbackground=colors['highlight'],
+                                  font=('Consolas', 10),
+                                  activestyle='none', exportselection=False)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.listbox.bind('<Configure>', self.on_resize)
+        self.listbox.bind('<Button-1>', lambda e: self.on_click(e, extend=False))
+        self.listbox.bind('<Shift-Button-1>', lambda e: self.on_click(e, extend=True))
+        self.listbox.bind('<Double-1>', self.on_double_click)
+        self.listbox.bind('<B1-Motion>', lambda e: 'break')
+        self.listbox.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.listbox.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll(3))
+
+    def selection(self):
+        frames = self.source()
+        return frames if frames is not None else ()
+
+    def refresh(self):
+        """Redraw the visible rows from the selection"""
+        frames = self.selection()
+        count = len(frames)
+        self.top = max(0, min(self.top, count - self.rows))
+        self.shown = frames.window(self.top, self.rows) if count else []
+
+        self.listbox.delete(0, tk.END)
+        for i, frame in enumerate(self.shown):
+            self.listbox.insert(tk.END, self.format_row(frame))
+            if self.marked and self.marked[0] <= frame <= self.marked[1]:
+                self.listbox.selection_set(i)
+
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + self.rows) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        return 'break'
+
+    def scroll(self, rows):
+        self.top += rows
+        return self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if action == 'moveto':
+            self.top = int(float(amount) * len(self.selection()))
+            self.refresh()
+        elif action == 'scroll':
+            self.scroll(int(amount) * (self.rows if unit == 'pages' else 1))
+
+    def on_resize(self, event):
+        """Fit the number of rows to the Listbox height"""
+        line_height = (tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+                       + 2 * int(self.listbox.cget('selectborderwidth')))
+        inset = int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness'))
+        rows = max(1, (event.height - 2 * inset) // line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+    def frame_at(self, y):
+        """Frame on the row under y, or None"""
+        row = self.listbox.nearest(y)
+        return self.shown[row] if 0 <= row < len(self.shown) else None
+
+    def on_click(self, event, extend):
+        frame = self.frame_at(event.y)
+        if frame is None:
+            return 'break'
+        if extend and self.anchor is not None:
+            self.marked = (min(self.anchor, frame), max(self.anchor, frame))
+        else:
+            self.anchor = frame
+            self.marked = (frame, frame)
+        return self.refresh()
+
+    def on_double_click(self, event):
+        frame = self.frame_at(event.y)
+        if frame is not None:
+            self.on_activate(frame)
+        return 'break'
+
+    def reset(self):
+        """Scroll to the top and forget the marked rows"""
+        self.top = 0
+        self.take_marked()
+        self.refresh()
+
+    def take_marked(self):
+        """The marked (first, last) frames, clearing the mark"""
+        marked = self.marked
+        self.marked = None
+        self.anchor = None
+        return marked
+
+    def show(self, frame):
+        """Scroll so that a selected frame's row is visible"""
+        frames = self.selection()
+        if frame not in frames:
+            return
+        position = frames.rank(frame)
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.rows:
+            self.top = position - self.rows + 1
+        self.refresh()
+
+
 # ============================================================
 # GIF Export Dialog
 # ============================================================
@@ -921,7 +1437,7 @@ class GifExportDialog:
 
         self.dialog = tk.Toplevel(parent)
         self.dialog.title(i18n.get('gif_settings'))
-        self.dialog.geometry("360x320")
+        self.dialog.geometry("380x510")
         self.dialog.configure(bg=colors['bg'])
         self.dialog.transient(parent)
         self.dialog.grab_set()
@@ -965,14 +1481,8 @@ class GifExportDialog:
         preset_frame.pack(fill=tk.X, pady=10)
         ttk.Label(preset_frame, text=i18n.get('preset')).pack(side=tk.LEFT)
 
-        presets = {
-            i18n.get('wechat'): (240, 10),
-            i18n.get('qq'): (200, 8),
-            i18n.get('general'): (320, 12)
-        }
-
-        for name, (w, f) in presets.items():
-            btn = ttk.Button(preset_frame, text=name, width=8,
+        for key, (w, f) in GIF_PRESETS.items():
+            btn = ttk.Button(preset_frame, text=i18n.get(key), width=8,
                            command=lambda w=w, f=f: self.apply_preset(w, f))
             btn.pack(side=tk.LEFT, padx=2)
 
@@ -985,6 +1495,52 @@ class GifExportDialog:
         loop_spin = ttk.Spinbox(loop_frame, from_=0, to=100, textvariable=self.loop_var, width=8)
         loop_spin.pack(side=tk.RIGHT, padx=5)
 
+        # Target size (Pillow engine only)
+        max_kb_frame = ttk.Frame(frame)
+        max_kb_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(max_kb_frame, text=i18n.get('max_kb')).pack(side=tk.LEFT)
+        ttk.Label(max_kb_frame, text=i18n.get('max_kb_hint'), foreground=self.colors['text_dim']).pack(side=tk.RIGHT)
+        self.max_kb_var = tk.IntVar(value=0)
+        max_kb_spin = ttk.Spinbox(max_kb_frame, from_=0, to=100000, increment=50,
+                                  textvariable=self.max_kb_var, width=8, command=self.update_engine_options)
+        max_kb_spin.pack(side=tk.RIGHT, padx=5)
+        max_kb_spin.bind('<KeyRelease>', lambda e: self.update_engine_options())
+
+        # Engine
+        engine_frame = ttk.Frame(frame)
+        engine_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(engine_frame, text=i18n.get('engine')).pack(side=tk.LEFT)
+        self.engine_var = tk.StringVar(value='pillow')
+        self.engine_buttons = {}
+        for engine in reversed(GIF_ENGINES):
+            button = ttk.Radiobutton(engine_frame, text=i18n.get('engine_' + engine), value=engine,
+                                     variable=self.engine_var, command=self.update_engine_options)
+            button.pack(side=tk.RIGHT, padx=2)
+            self.engine_buttons[engine] = button
+
+        # FFmpeg palette options
+        dither_frame = ttk.Frame(frame)
+        dither_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(dither_frame, text=i18n.get('dither')).pack(side=tk.LEFT)
+        self.dither_var = tk.StringVar(value=GIF_DITHERS[0])
+        self.dither_combo = ttk.Combobox(dither_frame, values=GIF_DITHERS, textvariable=self.dither_var,
+                                         state='readonly', width=14)
+        self.dither_combo.pack(side=tk.RIGHT)
+
+        stats_frame = ttk.Frame(frame)
+        stats_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(stats_frame, text=i18n.get('stats_mode')).pack(side=tk.LEFT)
+        self.stats_var = tk.StringVar(value=GIF_STATS_MODES[0])
+        self.stats_combo = ttk.Combobox(stats_frame, values=GIF_STATS_MODES, textvariable=self.stats_var,
+                                        state='readonly', width=14)
+        self.stats_combo.pack(side=tk.RIGHT)
+
+        self.diff_rect_var = tk.BooleanVar(value=True)
+        self.diff_rect_check = ttk.Checkbutton(frame, text=i18n.get('diff_rect'), variable=self.diff_rect_var)
+        self.diff_rect_check.pack(anchor=tk.W, pady=5)
+
+        self.update_engine_options()
+
         # Buttons
         btn_frame = ttk.Frame(frame)
         btn_frame.pack(fill=tk.X, pady=(20, 0))
@@ -998,16 +1554,116 @@ class GifExportDialog:
         self.width_var.set(width)
         self.fps_var.set(fps)
 
+    def update_engine_options(self):
+        """Enable the FFmpeg engine and its palette options only without a size limit"""
+        limited = self.get_max_kb() > 0
+        if limited:
+            # Size fitting always encodes with Pillow
+            self.engine_var.set('pillow')
+        self.engine_buttons['ffmpeg'].configure(state='disabled' if limited else 'normal')
+        enabled = self.engine_var.get() == 'ffmpeg'
+        self.dither_combo.configure(state='readonly' if enabled else 'disabled')
+        self.stats_combo.configure(state='readonly' if enabled else 'disabled')
+        self.diff_rect_check.configure(state='normal' if enabled else 'disabled')
+
+    def get_max_kb(self):
+        """Size limit in KB, 0 when unset or invalid"""
+        try:
+            return max(0, self.max_kb_var.get())
+        except tk.TclError:
+            return 0
+
     def confirm(self):
         """Confirm export"""
         self.result = {
             'fps': self.fps_var.get(),
             'width': self.width_var.get(),
-            'loop': self.loop_var.get()
+            'loop': self.loop_var.get(),
+            'engine': self.engine_var.get(),
+            'dither': self.dither_var.get(),
+            'stats_mode': self.stats_var.get(),
+            'diff_rect': self.diff_rect_var.get(),
+            'max_kb': self.get_max_kb()
         }
         self.dialog.destroy()
 
 
+# ============================================================
+# Progress Dialog
+# ============================================================
+
+def format_eta(seconds):
+    """Format seconds as m:ss"""
+    seconds = max(0, int(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class ProgressDialog:
+    """Non-blocking progress window with ETA and a cancel button.
+
+    Worker threads call report(); the UI thread calls refresh() to redraw.
+    """
+
+    def __init__(self, parent, colors, title, total):
+        self.colors = colors
+        self.total = total
+        self.done = 0
+        self.start_time = time.perf_counter()
+        self.cancel_event = threading.Event()
+
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(title)
+        self.dialog.geometry("360x140")
+        self.dialog.configure(bg=colors['bg'])
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.dialog.geometry(f"+{parent.winfo_x() + 200}+{parent.winfo_y() + 150}")
+
+        self.create_widgets(title)
+
+    def create_widgets(self, title):
+        """Create dialog widgets"""
+        frame = ttk.Frame(self.dialog, padding=20)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text=title, font=('Microsoft YaHei', 11, 'bold')).pack(anchor=tk.W)
+
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(frame, variable=self.progress_var, maximum=max(1, self.total),
+                        mode='determinate').pack(fill=tk.X, pady=10)
+
+        bottom = ttk.Frame(frame)
+        bottom.pack(fill=tk.X)
+        self.text_var = tk.StringVar(value="")
+        ttk.Label(bottom, textvariable=self.text_var,
+                  foreground=self.colors['text_dim']).pack(side=tk.LEFT)
+        ttk.Button(bottom, text=i18n.get('cancel'), command=self.cancel).pack(side=tk.RIGHT)
+
+    def report(self, done, total):
+        """Record progress (safe to call from any thread)"""
+        self.done = done
+        self.total = total
+
+    def refresh(self):
+        """Redraw progress and ETA"""
+        done = self.done
+        elapsed = time.perf_counter() - self.start_time
+        eta = elapsed / done * (self.total - done) if done else 0
+        self.progress_var.set(done)
+        self.text_var.set(i18n.get('progress_fmt').format(done=done, total=self.total,
+                                                           eta=format_eta(eta)))
+
+    def cancel(self):
+        """Request cancellation"""
+        self.cancel_event.set()
+
+    def close(self):
+        self.dialog.grab_release()
+        self.dialog.destroy()
+
+
 # ============================================================
 # Entry Point
 # ============================================================
@@ -0,0 +1,273 @@
+"""
+RonVideo2Pic - headless batch CLI
+Author: Ron
+Homepage: Ron.Quest
+
+Extract frames or build GIFs from many videos without a display:
+
+    python video2pic_cli.py extract a.mp4 b.mp4 --frames 10-200:5 --out frames/
+    python video2pic_cli.py extract *.mp4 --scenes --out shots/
+    python video2pic_cli.py gif a.mp4 --frames 1-60 --preset wechat --out gifs/
+    python video2pic_cli.py gif a.mp4 --frames 1-60 --max-kb 500 --out gifs/
+
+Frame numbers are 1-based like in the GUI. Jobs run concurrently
+(--jobs); one JSON line is printed per finished job, followed by a
+summary line. --metrics and --trace save per-stage timings for bug
+reports.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import hashlib
+import contextlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from video2pic_core import VideoPlayer, GifSizeFitter, SceneAnalysis, metrics, GIF_PRESETS, GIF_ENGINES, GIF_DITHERS, GIF_STATS_MODES
+
+
+def parse_frame_spec(spec, total_frames):
+    """Parse '1,5,10-200:5' (1-based, inclusive) into sorted 0-based frame numbers"""
+    if not spec:
+        return list(range(total_frames))
+
+    frames = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        step = 1
+        if ':' in part:
+            part, step_str = part.split(':', 1)
+            step = int(step_str)
+            if step < 1:
+                raise ValueError(f"Invalid step in frame spec: {step_str}")
+        if '-' in part:
+            first_str, last_str = part.split('-', 1)
+            first = int(first_str) if first_str else 1
+            last = int(last_str) if last_str else total_frames
+        else:
+            first = last = int(part)
+        for frame in range(max(first, 1), min(last, total_frames) + 1, step):
+            frames.add(frame - 1)
+    return sorted(frames)
+
+
+def output_names(videos):
+    """Output name per video: its file stem, plus a short hash of its path when stems clash"""
+    stems = {path: os.path.splitext(os.path.basename(path))[0] for path in videos}
+    # Compared case-insensitively, since outputs may land on a case-insensitive file system
+    counts = Counter(stem.lower() for stem in stems.values())
+    names = {}
+    for path, stem in stems.items():
+        if counts[stem.lower()] > 1:
+            stem += '_' + hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:6]
+        names[path] = stem
+    return names
+
+
+def output_path(args, video_path, suffix=''):
+    """Per-video output location inside --out"""
+    return os.path.join(args.out, args.output_names[video_path] + suffix)
+
+
+def video_workers(args):
+    """Decoders per video: --workers, or the cores shared between concurrent jobs"""
+    if args.workers:
+        return args.workers
+    return max(1, (os.cpu_count() or 1) // max(1, min(args.jobs, len(args.videos))))
+
+
+def run_extract(args, video_path):
+    player = VideoPlayer()
+    try:
+        if not player.load_video(video_path):
+            raise RuntimeError("failed to load video")
+        frames = parse_frame_spec(args.frames, player.video_info['total_frames'])
+        record = {}
+        if args.scenes:
+            analysis = player.load_scenes(workers=video_workers(args))
+            if not analysis:
+                raise RuntimeError("scene analysis failed")
+            wanted = set(frames)
+            frames = [f for f in player.select_scenes(analysis, args.scene_threshold) if f in wanted]
+            record['scenes'] = len(frames)
+        folder = output_path(args, video_path) if len(args.videos) > 1 else args.out
+        os.makedirs(folder, exist_ok=True)
+
+        exporter = player.create_exporter(video_workers(args))
+        count = exporter.export(frames, folder, image_format=args.format)
+        record.update({'frames': count, 'bytes': exporter.bytes_written, 'output': folder})
+        return record
+    finally:
+        player.cleanup()
+
+
+def run_gif(args, video_path):
+    player = VideoPlayer()
+    try:
+        if not player.load_video(video_path):
+            raise RuntimeError("failed to load video")
+        info = player.video_info
+        frames = parse_frame_spec(args.frames, info['total_frames'])
+
+        width, fps = GIF_PRESETS[args.preset]
+        width = args.width or width
+        fps = args.fps or fps
+        size = (width, int(info['height'] * width / info['width']))
+
+        path = output_path(args, video_path, '.gif')
+        os.makedirs(args.out, exist_ok=True)
+
+        if args.max_kb:
+            fit = GifSizeFitter(player, frames, width, fps, args.max_kb, loop=args.loop).fit(path)
+            if not fit:
+                raise RuntimeError("GIF generation failed")
+            return {'frames': fit['frames'], 'bytes': os.path.getsize(path), 'output': path, 'fit': fit}
+
+        count = {'frames': 0}
+
+        def images():
+            for _, img in player.iter_frames(frames, size=size, scale_flags='lanczos',
+                                             workers=video_workers(args)):
+                count['frames'] += 1
+                yield img
+
+        if args.engine == 'ffmpeg':
+            ok = player.ffmpeg.create_gif_palette(images(), path, fps=fps, width=width, loop=args.loop,
+                                                  stats_mode=args.stats_mode or GIF_STATS_MODES[0],
+                                                  dither=args.dither or GIF_DITHERS[0])
+        else:
+            ok = player.ffmpeg.create_gif(images(), path, fps=fps, width=width, loop=args.loop,
+                                          optimize=not args.full_frames)
+        if not ok:
+            raise RuntimeError("GIF generation failed")
+        return {'frames': count['frames'], 'bytes': os.path.getsize(path), 'output': path}
+    finally:
+        player.cleanup()
+
+
+def run_job(command, args, video_path):
+    """Run one job and return its result record"""
+    start = time.perf_counter()
+    record = {'command': command, 'video': video_path}
+    try:
+        record.update(JOBS[command](args, video_path))
+        record['ok'] = True
+    except Exception as e:
+        record.update({'ok': False, 'error': str(e), 'frames': 0, 'bytes': 0})
+    elapsed = time.perf_counter() - start
+    record['seconds'] = round(elapsed, 3)
+    record['fps'] = round(record['frames'] / elapsed, 2) if elapsed > 0 else 0.0
+    record['mb_written'] = round(record.pop('bytes') / (1024 * 1024), 3)
+    return record
+
+
+JOBS = {
+    'extract': run_extract,
+    'gif': run_gif,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='video2pic', description='RonVideo2Pic batch frame extraction and GIF generation')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(p):
+        p.add_argument('videos', nargs='+', help='input video files')
+        p.add_argument('--frames', help="1-based frames, e.g. '1,5,10-200:5' (default: all)")
+        p.add_argument('--out', required=True, help='output directory')
+        p.add_argument('--jobs', type=int, default=min(4, os.cpu_count() or 1),
+                       help='videos processed concurrently')
+        p.add_argument('--workers', type=int,
+                       help='parallel decoders per video (default: cores divided between jobs)')
+        p.add_argument('--metrics', help='write per-stage timings and counters to this JSON file')
+        p.add_argument('--trace', help='write a Chrome trace (chrome://tracing, Perfetto) to this file')
+
+    p = sub.add_parser('extract', help='export frames as images')
+    add_common(p)
+    p.add_argument('--format', choices=('png', 'jpg', 'bmp'), default='png')
+    p.add_argument('--scenes', action='store_true',
+                   help='export only the first frame of each shot (within --frames), skipping repeated shots')
+    p.add_argument('--scene-threshold', type=float, default=SceneAnalysis.threshold,
+                   help='scene-change score (0-1) that starts a new shot')
+
+    p = sub.add_parser('gif', help='export frames as a GIF')
+    add_common(p)
+    p.add_argument('--preset', choices=sorted(GIF_PRESETS), default='general')
+    p.add_argument('--width', type=int, help='override preset width')
+    p.add_argument('--fps', type=int, help='override preset fps')
+    p.add_argument('--loop', type=int, default=0, help='loop count (0=infinite)')
+    p.add_argument('--engine', choices=GIF_ENGINES, default='pillow')
+    p.add_argument('--dither', choices=GIF_DITHERS, help=f'ffmpeg engine (default: {GIF_DITHERS[0]})')
+    p.add_argument('--stats-mode', choices=GIF_STATS_MODES, help=f'ffmpeg engine (default: {GIF_STATS_MODES[0]})')
+    p.add_argument('--max-kb', type=int, default=0,
+                   help='fit the GIF under this size by lowering width, fps and colors (pillow engine)')
+    p.add_argument('--full-frames', action='store_true',
+                   help='store every frame whole instead of only the changed pixels (pillow engine)')
+    return parser
+
+
+def check_args(parser, args):
+    """Reject options that the chosen mode would silently ignore"""
+    if args.command != 'gif' or not args.max_kb:
+        return
+    ignored = [option for option, given in (('--engine ffmpeg', args.engine == 'ffmpeg'),
+                                            ('--dither', args.dither),
+                                            ('--stats-mode', args.stats_mode),
+                                            ('--full-frames', args.full_frames)) if given]
+    if ignored:
+        parser.error(f"--max-kb always encodes with the pillow engine; remove {', '.join(ignored)}")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    # The same file given twice would be written by two jobs at once
+    seen = set()
+    videos = []
+    for path in args.videos:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            videos.append(path)
+    args.videos = videos
+    args.output_names = output_names(args.videos)
+
+    # stdout carries only JSON lines; core diagnostics go to stderr
+    out = sys.stdout
+    start = time.perf_counter()
+    records = []
+    with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(run_job, args.command, args, path) for path in args.videos]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            print(json.dumps(record, ensure_ascii=False), file=out, flush=True)
+
+    elapsed = time.perf_counter() - start
+    frames = sum(r['frames'] for r in records)
+    summary = {
+        'summary': {
+            'jobs': len(records),
+            'failed': sum(1 for r in records if not r['ok']),
+            'frames': frames,
+            'seconds': round(elapsed, 3),
+            'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            'mb_written': round(sum(r['mb_written'] for r in records), 3),
+        }
+    }
+    print(json.dumps(summary), file=out, flush=True)
+
+    if args.metrics:
+        metrics.dump_json(args.metrics, summary=summary['summary'])
+    if args.trace:
+        metrics.dump_trace(args.trace)
+    return 0 if summary['summary']['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
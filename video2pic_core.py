@@ -0,0 +1,3479 @@
+"""
+RonVideo2Pic core - decoding, caching and export without any GUI
+Author: Ron
+Homepage: Ron.Quest
+
+Used by the Tk application (video2pic.py) and the headless batch CLI
+(video2pic_cli.py); scripts can stream frames with iter_frames() and
+aiter_frames(). Importing this module never imports tkinter.
+"""
+
+import os
+import io
+import sys
+import asyncio
+import concurrent.futures
+import subprocess
+import shutil
+import threading
+import queue
+import json
+import bisect
+import hashlib
+import mmap
+import struct
+import time
+import zlib
+import tempfile
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import MutableSet
+from contextlib import contextmanager
+from PIL import Image, ImageChops, GifImagePlugin
+
+
+# ============================================================
+# Metrics
+# ============================================================
+
+class StageHistogram:
+    """Latency histogram for one stage: log-spaced buckets plus recent samples"""
+
+    # Upper bucket bounds in milliseconds; the last bucket is open-ended
+    bounds_ms = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+    recent_limit = 2048
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(self.bounds_ms) + 1)
+        self.recent = deque(maxlen=self.recent_limit)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.recent.append(ms)
+
+    def percentile(self, q):
+        """q-th percentile (0-100) over the recent samples"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def to_dict(self):
+        labels = [f'<={b}' for b in self.bounds_ms] + [f'>{self.bounds_ms[-1]}']
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50), 3),
+            'p90_ms': round(self.percentile(90), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'buckets_ms': {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class Metrics:
+    """Process-wide stage timings, counters and gauges.
+
+    Stages are timed with `with metrics.timed('decode'):`. Every timed
+    span is also kept (bounded) as a Chrome trace event, so a session can
+    be opened in chrome://tracing or Perfetto.
+    """
+
+    trace_limit = 200000
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded data"""
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+            self.events = deque(maxlen=self.trace_limit)
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the enclosed block as one sample of stage"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.perf_counter())
+
+    def record(self, stage, start, end):
+        """Add a span measured with time.perf_counter()"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.add((end - start) * 1000)
+            self.events.append((stage, start, end, threading.get_ident()))
+
+    def count(self, name, n=1):
+        """Increment a counter"""
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        """Set a gauge to its latest value"""
+        if self.enabled:
+            with self.lock:
+                self.gauges[name] = value
+
+    def stage(self, name):
+        """Summary dict of one stage, or None if it never ran"""
+        with self.lock:
+            histogram = self.stages.get(name)
+            return histogram.to_dict() if histogram else None
+
+    def snapshot(self, **sections):
+        """All metrics as a JSON-serializable dict; sections are merged in"""
+        with self.lock:
+            data = {
+                'uptime_s': round(time.perf_counter() - self.origin, 3),
+                'stages': {name: h.to_dict() for name, h in sorted(self.stages.items())},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+        data.update(sections)
+        return data
+
+    def dump_json(self, path, **sections):
+        """Write snapshot() to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(**sections), f, indent=2)
+
+    def dump_trace(self, path):
+        """Write the recorded spans as a Chrome trace (JSON array format)"""
+        with self.lock:
+            events = list(self.events)
+            origin = self.origin
+        pid = os.getpid()
+        trace = [{
+            'name': stage,
+            'ph': 'X',
+            'ts': round((start - origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': pid,
+            'tid': tid,
+        } for stage, start, end, tid in events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+# Shared by the player, exporters and the GUI
+metrics = Metrics()
+
+
+# ============================================================
+# FFmpeg Helper
+# ============================================================
+
+# Platform GIF presets: i18n key -> (width, fps)
+GIF_PRESETS = {
+    'wechat': (240, 10),
+    'qq': (200, 8),
+    'general': (320, 12),
+}
+
+# GIF encoders selectable in the export dialog
+GIF_ENGINES = ('pillow', 'ffmpeg')
+GIF_DITHERS = ('sierra2_4a', 'floyd_steinberg', 'bayer', 'sierra2', 'none')
+GIF_STATS_MODES = ('full', 'diff', 'single')
+
+# 'fast' shows the nearest keyframe, 'exact' decodes the requested frame
+SEEK_MODES = ('fast', 'exact')
+
+# Raw pixel formats a decoder can pipe: ffmpeg name -> (PIL mode, bytes per pixel)
+PIX_FMTS = {
+    'rgb24': ('RGB', 3),
+    'rgba': ('RGBA', 4),
+    'gray': ('L', 1),
+}
+
+class FFmpegHelper:
+    """FFmpeg helper for video decoding"""
+
+    def __init__(self):
+        self.ffmpeg_path = self._find_ffmpeg()
+        self.ffprobe_path = self._find_ffprobe()
+
+    def _find_ffmpeg(self):
+        """Find ffmpeg executable - prioritize local bundled version"""
+        return self._find_tool('ffmpeg')
+
+    def _find_ffprobe(self):
+        """Find ffprobe executable - prioritize local bundled version"""
+        return self._find_tool('ffprobe')
+
+    def _find_tool(self, name):
+        # The bundled binaries are Windows builds; elsewhere use the system ones
+        exe = name + '.exe' if sys.platform == 'win32' else name
+
+        # Priority 1: bundled binary in ffmpeg/ subfolder
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        local_path = os.path.join(base_dir, 'ffmpeg', exe)
+        if os.path.isfile(local_path):
+            return local_path
+
+        # Priority 2: binary in same directory
+        same_dir = os.path.join(base_dir, exe)
+        if os.path.isfile(same_dir):
+            return same_dir
+
+        # Priority 3: system PATH
+        result = shutil.which(name)
+        if result:
+            return result
+
+        return name
+
+    @metrics.timed('probe')
+    def get_video_info(self, video_path):
+        """Get video information"""
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            video_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+            info = json.loads(result.stdout)
+
+            for stream in info.get('streams', []):
+                if stream.get('codec_type') == 'video':
+                    width = stream.get('width', 0)
+                    height = stream.get('height', 0)
+
+                    # Parse frame rate
+                    fps_str = stream.get('r_frame_rate', '30/1')
+                    if '/' in fps_str:
+                        num, den = map(float, fps_str.split('/'))
+                        fps = num / den if den != 0 else 30
+                    else:
+                        fps = float(fps_str)
+
+                    # Parse total frames
+                    nb_frames = stream.get('nb_frames')
+                    if nb_frames:
+                        total_frames = int(nb_frames)
+                    else:
+                        duration = float(info.get('format', {}).get('duration', 0))
+                        total_frames = int(duration * fps) if duration > 0 else 0
+
+                    return {
+                        'width': width,
+                        'height': height,
+                        'fps': fps,
+                        'total_frames': total_frames,
+                        'duration': float(info.get('format', {}).get('duration', 0)),
+                        'start_time': float(info.get('format', {}).get('start_time', 0) or 0)
+                    }
+        except Exception as e:
+            print(f"Failed to get video info: {e}")
+        return None
+
+    def extract_frame(self, video_path, frame_number, fps, output_path, video_info=None, frame_index=None):
+        """Extract one frame and save it to output_path.
+
+        Pass the video_info and frame_index already loaded for the video
+        (VideoPlayer keeps both); nothing is probed or scanned again then.
+        With frame_index the frame is decoded up to its own timestamp, so it
+        never snaps to a neighbouring keyframe; without it frames are timed
+        by fps, which is only exact for constant frame rate video.
+        """
+        info = dict(video_info or self.get_video_info(video_path) or {})
+        if not info:
+            return False
+        info['fps'] = fps or info['fps']
+        decoder = self.open_decoder(video_path, info, frame_index)
+        try:
+            img = decoder.read_frame(frame_number)
+            if img is None:
+                return False
+            img.save(output_path)
+            return True
+        except Exception as e:
+            print(f"Failed to extract frame: {e}")
+            return False
+        finally:
+            decoder.close()
+
+    @metrics.timed('index')
+    def build_frame_index(self, video_path, start_time=0.0, progress=None, cancel_event=None):
+        """Scan video packets once to map frame numbers to timestamps and keyframes.
+
+        progress(count) is called as packets arrive; setting cancel_event
+        stops the scan and returns None.
+        """
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'quiet',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,dts_time,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ]
+        process = None
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, text=True,
+                                       creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+            packets = []
+            for line in process.stdout:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                parts = line.strip().split(',')
+                if len(parts) < 3:
+                    continue
+                # Discarded packets (before an edit list start, e.g. after a
+                # stream-copy trim) are decoded but never shown
+                if 'D' in parts[2]:
+                    continue
+                ts = parts[0] if parts[0] != 'N/A' else parts[1]
+                if ts == 'N/A':
+                    return None
+                packets.append((float(ts), 'K' in parts[2]))
+                if progress and len(packets) % 500 == 0:
+                    progress(len(packets))
+            process.wait()
+
+            if not packets:
+                return None
+            if progress:
+                progress(len(packets))
+
+            # Packets come in decode order; frames are numbered in presentation order
+            packets.sort()
+            pts = [ts for ts, _ in packets]
+            keyframes = [i for i, (_, key) in enumerate(packets) if key]
+            # Seeking to the first shown frame decodes from a discarded keyframe
+            if not keyframes or keyframes[0] != 0:
+                keyframes.insert(0, 0)
+            return FrameIndex(pts, keyframes, start_time)
+        except Exception as e:
+            print(f"Failed to build frame index: {e}")
+        finally:
+            if process and process.poll() is None:
+                process.kill()
+                process.wait()
+        return None
+
+    @metrics.timed('filmstrip')
+    def build_filmstrip(self, video_path, video_info, tile_height=48, max_tiles=1000,
+                        progress=None, cancel_event=None):
+        """Decode keyframe thumbnails in one pass and pack them into a Filmstrip.
+
+        Only keyframes are decoded (-skip_frame nokey). For long videos a
+        select filter keeps at most about max_tiles of them, evenly spaced
+        in time. progress(count) is called as thumbnails arrive; setting
+        cancel_event stops the pass and returns None.
+        """
+        width, height = video_info['width'], video_info['height']
+        if not width or not height:
+            return None
+        tile_size = (max(2, round(tile_height * width / height / 2) * 2), tile_height)
+        tile_bytes = tile_size[0] * tile_size[1] * 3
+
+        filters = []
+        duration = video_info.get('duration') or 0
+        if duration > 0 and max_tiles:
+            interval = duration / max_tiles
+            filters.append(f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.6f})'")
+        filters += ['showinfo=checksum=0', 'scale={}:{}:flags=area'.format(*tile_size)]
+        cmd = [
+            self.ffmpeg_path,
+            '-hide_banner', '-nostats',
+            '-v', 'info',
+            '-skip_frame', 'nokey',
+            '-copyts',
+            '-i', video_path,
+            '-an', '-sn',
+            '-fps_mode', 'passthrough',
+            '-vf', ','.join(filters),
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            'pipe:1'
+        ]
+
+        def read_times(stream, times):
+            for line in stream:
+                pos = line.find(b'pts_time:')
+                if pos >= 0:
+                    try:
+                        times.append(float(line[pos + 9:].split()[0]))
+                    except (ValueError, IndexError):
+                        pass
+
+        process = None
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, bufsize=tile_bytes,
+                                       creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+            times = []
+            reader = threading.Thread(target=read_times, args=(process.stderr, times), daemon=True)
+            reader.start()
+            tiles = []
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                data = process.stdout.read(tile_bytes)
+                if len(data) < tile_bytes:
+                    break
+                tiles.append(Image.frombytes('RGB', tile_size, data))
+                if progress and len(tiles) % 20 == 0:
+                    progress(len(tiles))
+            process.wait()
+            reader.join()
+
+            count = min(len(tiles), len(times))
+            if not count:
+                return None
+            start_time = video_info.get('start_time', 0.0)
+            return Filmstrip.from_tiles(tiles[:count], [t - start_time for t in times[:count]])
+        except Exception as e:
+            print(f"Failed to build filmstrip: {e}")
+        finally:
+            if process and process.poll() is None:
+                process.kill()
+                process.wait()
+        return None
+
+    @metrics.timed('scenes')
+    def analyze_scenes(self, video_path, video_info, frame_index=None, workers=None,
+                       progress=None, cancel_event=None):
+        """Decode every frame at a tiny size and score it for scene changes.
+
+        With a frame index the video is split into segments decoded by
+        up to `workers` processes (default: one per core). progress(done,
+        total) is called as frames are scored; setting cancel_event stops
+        the pass and returns None.
+        """
+        total = frame_index.frame_count if frame_index else video_info['total_frames']
+
+        def open_decoder():
+            decoder = self.open_decoder(video_path, video_info, frame_index, SceneAnalysis.size,
+                                        'area', pix_fmt='gray')
+            # Deblocking is invisible at this size and a good part of h264 decode time
+            decoder.skip_loop_filter = True
+            return decoder
+
+        width, height = SceneAnalysis.size
+        workers = parallel_workers(width * height, 64, workers)
+        frames = SegmentDecoder(open_decoder, range(total), frame_index, workers, min_frames=250)
+        try:
+            scorer = SceneScorer()
+            for _, img in frames:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                scorer.add(img)
+                if progress and len(scorer.scores) % 250 == 0:
+                    progress(len(scorer.scores), total)
+            if not scorer.scores:
+                return None
+            if progress:
+                progress(len(scorer.scores), total)
+            return SceneAnalysis(scorer.scores, scorer.hashes)
+        except Exception as e:
+            print(f"Failed to analyze scenes: {e}")
+        return None
+
+    def open_decoder(self, video_path, video_info, frame_index=None, size=None, scale_flags=None,
+                     pix_fmt='rgb24'):
+        """Open a persistent decode session for a video.
+
+        With size, frames are scaled by ffmpeg before they reach the pipe.
+        """
+        return FrameDecoder(self.ffmpeg_path, video_path,
+                            video_info['width'], video_info['height'], video_info['fps'],
+                            frame_index, size, scale_flags, pix_fmt)
+
+    def create_gif(self, frames, output_path, fps=10, width=None, loop=0, colors=256, optimize=True):
+        """Create GIF animation.
+
+        frames is an iterable of PIL images or image paths. Each frame is
+        resized, quantized to at most colors entries and written as soon as
+        it arrives, so memory use does not grow with the length of the
+        animation. optimize stores only what changed between frames (see
+        GifWriter).
+        """
+        duration = int(1000 / fps)
+        writer = None
+        try:
+            for frame in frames:
+                img = Image.open(frame) if isinstance(frame, str) else frame
+                if width and img.width != width:
+                    ratio = width / img.width
+                    new_height = int(img.height * ratio)
+                    img = img.resize((width, new_height), Image.Resampling.LANCZOS)
+                if writer is None:
+                    writer = GifWriter(output_path, duration, loop, colors, optimize)
+                writer.write(img)
+        except Exception as e:
+            print(f"Failed to create GIF: {e}")
+            return False
+        finally:
+            if writer:
+                writer.close()
+
+        return writer is not None and writer.frame_count > 0 and os.path.exists(output_path)
+
+    @metrics.timed('gif_ffmpeg')
+    def create_gif_palette(self, frames, output_path, fps=10, width=None, loop=0,
+                           stats_mode='full', dither='sierra2_4a', diff_rect=True):
+        """Create GIF animation with ffmpeg's palettegen/paletteuse filters.
+
+        frames (PIL images) are piped into a single ffmpeg process that builds
+        one optimized palette for the whole clip and encodes against it.
+        stats_mode is 'full', 'diff' or 'single' (a new palette per frame).
+        """
+        proc = None
+        size = None
+        try:
+            for img in frames:
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                if size is None:
+                    if width and img.width != width:
+                        size = (width, int(img.height * width / img.width))
+                    else:
+                        size = img.size
+                    new_palette = ':new=1' if stats_mode == 'single' else ''
+                    graph = (f'split[a][b];[a]palettegen=stats_mode={stats_mode}[p];'
+                             f'[b][p]paletteuse=dither={dither}'
+                             f':diff_mode={"rectangle" if diff_rect else "none"}{new_palette}')
+                    cmd = [
+                        self.ffmpeg_path,
+                        '-v', 'error',
+                        '-y',
+                        '-f', 'rawvideo',
+                        '-pix_fmt', 'rgb24',
+                        '-s', f'{size[0]}x{size[1]}',
+                        '-framerate', str(fps),
+                        '-i', 'pipe:0',
+                        '-filter_complex', graph,
+                        '-loop', str(loop),
+                        output_path
+                    ]
+                    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+                if img.size != size:
+                    img = img.resize(size, Image.Resampling.LANCZOS)
+                with metrics.timed('gif_pipe'):
+                    proc.stdin.write(img.tobytes())
+
+            if proc is None:
+                return False
+            proc.stdin.close()
+            return proc.wait() == 0 and os.path.exists(output_path)
+        except Exception as e:
+            print(f"Failed to create GIF: {e}")
+            if proc:
+                proc.kill()
+                proc.wait()
+            return False
+
+
+def quantize_gif_frame(img, colors=256):
+    """Reduce an image to an adaptive palette of at most colors entries"""
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img.convert('P', palette=Image.Palette.ADAPTIVE, colors=colors)
+
+
+def gif_frame_nbytes(frame, duration=100, offset=(0, 0), **params):
+    """Encoded size of a quantized frame as a GIF frame with a local palette"""
+    blocks = GifImagePlugin.getdata(frame, offset, duration=duration, include_color_table=True, **params)
+    return sum(len(block) for block in blocks)
+
+
+# Channel difference above which a pixel counts as changed (0 = lossless)
+GIF_DELTA_THRESHOLD = 8
+
+_delta_luts = {}
+
+
+def gif_delta(canvas, img, threshold=GIF_DELTA_THRESHOLD):
+    """Changed region of img against canvas (both RGB, same size).
+
+    Returns (bbox, mask): the bounding box of the pixels where any channel
+    differs by more than threshold, and an 'L' mask of those pixels cropped
+    to it. Both are None when nothing changed.
+    """
+    lut = _delta_luts.get(threshold)
+    if lut is None:
+        lut = _delta_luts[threshold] = [255 if v > threshold else 0 for v in range(256)]
+    r, g, b = ImageChops.difference(img, canvas).split()
+    mask = ImageChops.lighter(ImageChops.lighter(r, g), b).point(lut)
+    bbox = mask.getbbox()
+    if bbox is None:
+        return None, None
+    return bbox, mask.crop(bbox)
+
+
+def quantize_gif_delta(region, mask, colors=256):
+    """Quantize a changed region and make the pixels outside mask transparent.
+
+    One palette entry is kept free for the transparent index, which follows
+    the last colour actually used. Returns (frame, transparency).
+    """
+    frame = quantize_gif_frame(region, colors - 1)
+    palette = frame.getpalette()
+    transparency = len(palette) // 3
+    frame.putpalette(palette + [0, 0, 0])
+    frame.paste(transparency, mask=ImageChops.invert(mask))
+    return frame, transparency
+
+
+class GifWriter:
+    """Incremental GIF encoder.
+
+    Frames are quantized to an adaptive palette one by one and appended to
+    the file straight away; the first frame's palette becomes the global
+    table and later frames carry a local one.
+
+    With optimize, later frames only store the rectangle that changed since
+    the previous frame, with unchanged pixels left transparent over it
+    (disposal 1, keep the previous frame). Frames without changes extend the
+    previous frame's duration instead of being written, so one frame is held
+    back until the next one shows whether it changes.
+    """
+
+    delta_threshold = GIF_DELTA_THRESHOLD
+
+    def __init__(self, path, duration, loop=0, colors=256, optimize=True):
+        self.fp = open(path, 'wb')
+        self.duration = duration
+        self.loop = loop
+        self.colors = colors
+        self.optimize = optimize
+        self.size = None
+        self.frame_count = 0
+        self.frames_merged = 0
+        # Last written source pixel at every position; compared against the
+        # source rather than the quantized output so that palette noise in
+        # static areas never counts as a change
+        self.canvas = None
+        self.pending = None  # [frame, offset, params] awaiting its final duration
+
+    def write(self, img):
+        """Quantize and append one frame"""
+        if self.size and img.size != self.size:
+            img = img.resize(self.size, Image.Resampling.LANCZOS)
+        self.frame_count += 1
+        if self.optimize and self.size:
+            self._write_delta(img)
+            return
+
+        with metrics.timed('gif_quantize'):
+            frame = quantize_gif_frame(img, self.colors)
+
+        params = {'duration': self.duration}
+        if self.size is None:
+            self.size = frame.size
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+            for block in header:
+                self.fp.write(block)
+        else:
+            params['include_color_table'] = True
+
+        if self.optimize:
+            self.canvas = img.convert('RGB')
+            params['disposal'] = 1
+            self.pending = [frame, (0, 0), params]
+        else:
+            self._write_frame(frame, (0, 0), params)
+
+    def _write_delta(self, img):
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        with metrics.timed('gif_delta'):
+            bbox, mask = gif_delta(self.canvas, img, self.delta_threshold)
+        if bbox is None:
+            self.pending[2]['duration'] += self.duration
+            self.frames_merged += 1
+            return
+
+        region = img.crop(bbox)
+        with metrics.timed('gif_quantize'):
+            frame, transparency = quantize_gif_delta(region, mask, self.colors)
+        self.canvas.paste(region, bbox[:2], mask)
+        self._flush()
+        self.pending = [frame, bbox[:2], {'duration': self.duration, 'include_color_table': True,
+                                          'disposal': 1, 'transparency': transparency}]
+
+    def _write_frame(self, frame, offset, params):
+        with metrics.timed('gif_write'):
+            for block in GifImagePlugin.getdata(frame, offset, **params):
+                self.fp.write(block)
+
+    def _flush(self):
+        if self.pending:
+            self._write_frame(*self.pending)
+            self.pending = None
+
+    def close(self):
+        """Write the held-back frame and the trailer and close the file"""
+        if self.fp:
+            try:
+                self._flush()
+            finally:
+                self.fp.write(b';')
+                self.fp.close()
+                self.fp = None
+
+
+class FrameIndex:
+    """Per-video map of frame number to presentation time, plus keyframe positions"""
+
+    def __init__(self, pts, keyframes, start_time=0.0):
+        self.pts = pts
+        self.keyframes = keyframes or [0]
+        self.start_time = start_time
+
+    @property
+    def frame_count(self):
+        return len(self.pts)
+
+    def time_of(self, frame_number):
+        """Presentation time of a frame relative to the start of the file"""
+        return self.pts[frame_number] - self.start_time
+
+    def frame_at_time(self, seconds):
+        """Frame shown at a time relative to the start of the file"""
+        i = bisect.bisect_right(self.pts, seconds + self.start_time) - 1
+        return max(0, min(i, self.frame_count - 1))
+
+    def keyframe_before(self, frame_number):
+        """Nearest keyframe at or before frame_number"""
+        i = bisect.bisect_right(self.keyframes, frame_number) - 1
+        return self.keyframes[max(i, 0)]
+
+    def nearest_keyframe(self, frame_number):
+        """Keyframe closest to frame_number, in either direction"""
+        i = bisect.bisect_right(self.keyframes, frame_number)
+        before = self.keyframes[max(i - 1, 0)]
+        if i < len(self.keyframes) and self.keyframes[i] - frame_number < frame_number - before:
+            return self.keyframes[i]
+        return before
+
+    def nearest_frame(self, pts):
+        """Frame whose absolute timestamp (as in the file) is closest to pts"""
+        i = bisect.bisect_left(self.pts, pts)
+        if i >= len(self.pts):
+            return len(self.pts) - 1
+        if i > 0 and pts - self.pts[i - 1] < self.pts[i] - pts:
+            return i - 1
+        return i
+
+    def to_dict(self):
+        return {'pts': self.pts, 'keyframes': self.keyframes, 'start_time': self.start_time}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['pts'], data['keyframes'], data.get('start_time', 0.0))
+
+
+def frame_spans(frames):
+    """Collapse sorted frame numbers into inclusive (first, last) spans"""
+    spans = []
+    for frame in frames:
+        if spans and frame == spans[-1][1] + 1:
+            spans[-1][1] = frame
+        else:
+            spans.append([frame, frame])
+    return [tuple(span) for span in spans]
+
+
+def group_runs(frames, frame_index=None, max_gap=60, max_spans=200):
+    """Split frame numbers into runs that are each worth one sequential decode.
+
+    A new run starts when seeking would skip more than max_gap frames of
+    decoding (measured from the nearest keyframe when an index is
+    available), or when the run's select expression would get too long.
+    """
+    runs = []
+    spans = 0
+    for frame in sorted(set(frames)):
+        if runs:
+            prev = runs[-1][-1]
+            start = frame_index.keyframe_before(frame) if frame_index else frame
+            if start - prev <= max_gap and (frame == prev + 1 or spans < max_spans):
+                if frame != prev + 1:
+                    spans += 1
+                runs[-1].append(frame)
+                continue
+        runs.append([frame])
+        spans = 1
+    return runs
+
+
+def split_segments(frames, frame_index=None, count=1, min_frames=32):
+    """Split frames into about `count` runs that can be decoded independently.
+
+    Runs come from group_runs; long ones are cut further, at least
+    min_frames apart and (with an index) only where a new keyframe
+    begins, so no frame has to be decoded by two segments.
+    """
+    frames = sorted(set(frames))
+    target = max(min_frames, -(-len(frames) // max(1, count)))
+    segments = []
+    for run in group_runs(frames, frame_index):
+        piece = [run[0]]
+        for frame in run[1:]:
+            if len(piece) >= target and (frame_index is None
+                                         or frame_index.keyframe_before(frame) > piece[-1]):
+                segments.append(piece)
+                piece = [frame]
+            else:
+                piece.append(frame)
+        segments.append(piece)
+    return segments
+
+
+def parallel_workers(frame_bytes, memory_limit_mb, workers=None, buffered_frames=8):
+    """Number of concurrent decoders: one per core, fewer if memory_limit_mb is too small.
+
+    Each decoder is counted as buffered_frames frames (its queue, the pipe
+    and the reference frames ffmpeg keeps).
+    """
+    max_workers = max(1, int(memory_limit_mb * 1024 * 1024) // max(1, frame_bytes * buffered_frames))
+    return max(1, min(workers or os.cpu_count() or 1, max_workers))
+
+
+class FrameDecoder:
+    """Long-lived ffmpeg rawvideo pipe that streams frames forward.
+
+    The process is only restarted when a request seeks backward or
+    past a keyframe (or, without an index, further ahead than decoding
+    forward would be worth).
+
+    With a frame index every restart is verified: ffmpeg reports the
+    timestamp of the first frame it sends (showinfo), and if the seek did
+    not land on the requested frame the decoder re-seeks from an earlier
+    keyframe and decodes forward to it.
+    """
+
+    # Without an index: beyond this many frames ahead a fresh seek is cheaper
+    max_forward_skip = 60
+    # swscale filter used when decoding at a reduced size
+    scale_flags = 'fast_bilinear'
+    # Check where each seek landed against the frame index
+    verify = True
+    # Decoder threads inside ffmpeg (None: ffmpeg's default, one per core)
+    threads = None
+    # Skip deblocking; slightly blockier frames, noticeably faster h264 decoding
+    skip_loop_filter = False
+
+    def __init__(self, ffmpeg_path, video_path, width, height, fps, frame_index=None, size=None,
+                 scale_flags=None, pix_fmt='rgb24'):
+        self.ffmpeg_path = ffmpeg_path
+        if scale_flags:
+            self.scale_flags = scale_flags
+        self.video_path = video_path
+        self.scaled = size is not None and tuple(size) != (width, height)
+        self.width, self.height = size if self.scaled else (width, height)
+        self.fps = fps
+        self.frame_index = frame_index
+        self.pix_fmt = pix_fmt
+        self.mode, bytes_per_pixel = PIX_FMTS[pix_fmt]
+        self.frame_bytes = self.width * self.height * bytes_per_pixel
+        self.process = None
+        self.next_frame = 0
+        self.first_pts = None
+        self._skip_buffer = bytearray(self.frame_bytes)
+
+    @property
+    def verifying(self):
+        return self.verify and self.frame_index is not None
+
+    def _seek_args(self, frame_number, fast=False):
+        """Input options that make frame_number the first frame on the pipe"""
+        index = self.frame_index
+        if frame_number == 0:
+            return []
+        if not index or frame_number >= index.frame_count:
+            return ['-ss', str(frame_number / self.fps)]
+
+        if fast:
+            # frame_number is a keyframe: land on it and decode nothing before it.
+            # Aim for the middle of its GOP; just past the keyframe, demuxers
+            # that seek by decode time (Matroska with B-frames) land a GOP early
+            i = bisect.bisect_right(index.keyframes, frame_number)
+            end = index.keyframes[i] if i < len(index.keyframes) else index.frame_count
+            last = min(max(frame_number + 1, end - 1), index.frame_count - 1)
+            t = (index.time_of(frame_number) + index.time_of(last)) / 2
+            return ['-noaccurate_seek', '-ss', f'{t:.6f}']
+
+        # Seek halfway between the previous frame and the target: the demuxer
+        # jumps to a keyframe before it and ffmpeg discards everything ahead
+        # of the target, so timestamp rounding can never shift the result
+        t = (index.time_of(frame_number - 1) + index.time_of(frame_number)) / 2
+        return ['-ss', f'{t:.6f}']
+
+    def _start(self, frame_number, select=None, max_frames=None, fast=False):
+        """(Re)start ffmpeg so that the next frame on the pipe is frame_number.
+
+        select is an ffmpeg select expression over frame numbers relative
+        to frame_number; only matching frames are sent down the pipe.
+        """
+        self.close()
+        verifying = self.verifying
+        cmd = [
+            self.ffmpeg_path,
+            '-hide_banner', '-nostats',
+            # showinfo logs at info level; -copyts keeps its timestamps absolute
+            '-v', 'info' if verifying else 'error',
+            *self._seek_args(frame_number, fast),
+        ]
+        if verifying:
+            cmd.append('-copyts')
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        if self.skip_loop_filter:
+            cmd += ['-skip_loop_filter', 'all']
+        cmd += [
+            '-i', self.video_path,
+            '-an', '-sn',
+            '-fps_mode', 'passthrough',
+        ]
+        filters = []
+        if select:
+            filters.append(f"select='{select}'")
+        if verifying:
+            filters.append('showinfo=checksum=0')
+        if self.scaled:
+            filters.append(f'scale={self.width}:{self.height}:flags={self.scale_flags}')
+        if filters:
+            cmd += ['-vf', ','.join(filters)]
+        if max_frames:
+            cmd += ['-frames:v', str(max_frames)]
+        cmd += [
+            '-f', 'rawvideo',
+            '-pix_fmt', self.pix_fmt,
+            'pipe:1'
+        ]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE if verifying else subprocess.DEVNULL,
+                                        bufsize=self.frame_bytes,
+                                        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+        self.next_frame = frame_number
+        self.first_pts = None
+        if verifying:
+            found = ([], threading.Event())
+            self.first_pts = found
+            threading.Thread(target=self._watch_stderr, args=(self.process.stderr, found),
+                             daemon=True).start()
+
+    @staticmethod
+    def _watch_stderr(stream, found):
+        """Record the timestamp of the first frame showinfo reports, then keep draining"""
+        values, done = found
+        try:
+            for line in stream:
+                if done.is_set():
+                    continue
+                pos = line.find(b'pts_time:')
+                if pos < 0:
+                    continue
+                try:
+                    values.append(float(line[pos + 9:].split()[0]))
+                except (ValueError, IndexError):
+                    continue
+                done.set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            done.set()
+
+    def _landed_frame(self):
+        """Frame number ffmpeg actually started at, or None if unknown"""
+        if not self.first_pts:
+            return None
+        values, done = self.first_pts
+        done.wait()
+        if not values:
+            return None
+        return self.frame_index.nearest_frame(values[0])
+
+    def _seek(self, frame_number):
+        """Restart at frame_number, falling back to earlier keyframes if the seek overshoots"""
+        self._start(frame_number)
+        if not self.verifying:
+            return
+        index = self.frame_index
+        fallbacks = [index.keyframe_before(max(0, index.keyframe_before(frame_number) - 1)), 0]
+        while True:
+            landed = self._landed_frame()
+            if landed is None or landed == self.next_frame:
+                return
+            metrics.count('seek_corrected')
+            if landed < frame_number:
+                # Landed early: the caller decodes forward to the target
+                self.next_frame = landed
+                return
+            seek_frame = fallbacks.pop(0) if fallbacks else None
+            if seek_frame is None:
+                print(f"Failed to seek to frame {frame_number}: landed on {landed}")
+                self.next_frame = landed
+                return
+            self._start(seek_frame)
+
+    def _needs_restart(self, frame_number):
+        if self.process is None or frame_number < self.next_frame:
+            return True
+        if self.frame_index:
+            # Restarting only pays off if it lets us begin at a later keyframe
+            return self.frame_index.keyframe_before(frame_number) > self.next_frame
+        return frame_number - self.next_frame > self.max_forward_skip
+
+    def _skip(self):
+        """Discard one frame from the pipe"""
+        view = memoryview(self._skip_buffer)
+        got = 0
+        while got < self.frame_bytes:
+            n = self.process.stdout.readinto(view[got:])
+            if not n:
+                return False
+            got += n
+        self.next_frame += 1
+        return True
+
+    def _read(self):
+        """Read one raw frame from the pipe"""
+        data = self.process.stdout.read(self.frame_bytes)
+        if len(data) < self.frame_bytes:
+            return None
+        self.next_frame += 1
+        return data
+
+    def _image(self, data):
+        return Image.frombuffer(self.mode, (self.width, self.height), data, 'raw', self.mode, 0, 1)
+
+    def read_frame(self, frame_number):
+        """Decode exactly frame_number and return it as an RGB image"""
+        start = time.perf_counter()
+        restarted = False
+        try:
+            if self._needs_restart(frame_number):
+                self._seek(frame_number)
+                restarted = True
+
+            if self.next_frame < frame_number:
+                metrics.count('frames_skipped', frame_number - self.next_frame)
+            while self.next_frame < frame_number:
+                if not self._skip():
+                    self.close()
+                    return None
+
+            data = self._read()
+        except Exception as e:
+            print(f"Failed to decode frame: {e}")
+            data = None
+        metrics.record('seek' if restarted else 'decode', start, time.perf_counter())
+
+        if data is None:
+            self.close()
+            return None
+        return self._image(data)
+
+    def read_keyframe(self, frame_number):
+        """Decode the keyframe nearest to frame_number without decoding up to the target.
+
+        Fast approximate seek for scrubbing. Returns (frame_number, image)
+        for the frame actually decoded, or (frame_number, None).
+        """
+        index = self.frame_index
+        if not index or frame_number >= index.frame_count:
+            return frame_number, self.read_frame(frame_number)
+
+        keyframe = index.nearest_keyframe(frame_number)
+        if self.process is not None and not self._needs_restart(keyframe):
+            # Already streaming just ahead of it: reading on is cheapest
+            return keyframe, self.read_frame(keyframe)
+
+        start = time.perf_counter()
+        try:
+            self._start(keyframe, fast=True)
+            landed = self._landed_frame()
+            data = self._read() if landed in (None, keyframe) else None
+        except Exception as e:
+            print(f"Failed to decode frame: {e}")
+            landed, data = keyframe, None
+        metrics.record('seek_fast', start, time.perf_counter())
+
+        if landed not in (None, keyframe):
+            # Landed in another GOP: never show that frame as the keyframe
+            metrics.count('seek_corrected')
+            self.close()
+            return keyframe, self.read_frame(keyframe)
+        if data is None:
+            self.close()
+            return frame_number, None
+        return keyframe, self._image(data)
+
+    def read_run(self, frames):
+        """Decode a sorted run of frames in one sequential ffmpeg pass.
+
+        Frames in the gaps are decoded but dropped inside ffmpeg by a
+        select filter, so they are never converted or piped.
+        Yields (frame_number, image).
+        """
+        first = frames[0]
+        terms = ['between(n,{},{})'.format(a - first, b - first) for a, b in frame_spans(frames)]
+        try:
+            self._start(first, select='+'.join(terms), max_frames=len(frames))
+            landed = self._landed_frame()
+            if landed is not None and landed != first:
+                # The select filter counts from where the seek landed; decode exactly instead
+                metrics.count('seek_corrected')
+                self.close()
+                for frame in frames:
+                    img = self.read_frame(frame)
+                    if img is None:
+                        break
+                    yield frame, img
+                return
+
+            for frame in frames:
+                with metrics.timed('decode_run'):
+                    data = self._read()
+                if data is None:
+                    break
+                yield frame, self._image(data)
+        finally:
+            # The pipe no longer yields consecutive frames; never reuse it
+            self.close()
+
+    def abort(self):
+        """Kill ffmpeg from another thread so that a blocked read returns at once"""
+        process = self.process
+        if process:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def close(self):
+        """Terminate the decoder process"""
+        if self.process:
+            try:
+                self.process.stdout.close()
+                self.process.kill()
+                self.process.wait()
+                if self.process.stderr:
+                    self.process.stderr.close()
+            except Exception:
+                pass
+            self.process = None
+
+
+# ============================================================
+# Segment-Parallel Decoding
+# ============================================================
+
+class SegmentDecoder:
+    """Decode a frame list with several ffmpeg processes, yielding frames in order.
+
+    The frames are split at keyframes into segments (split_segments) that
+    decoders on worker threads handle independently. Each segment feeds a
+    small bounded queue and at most `workers` segments are in flight, so
+    memory stays at about workers x queue_frames frames however long the
+    range is. Without a frame index seeks are not exact, so the frames are
+    decoded by a single process.
+    """
+
+    queue_frames = 8
+    # More segments than workers, so a slow segment does not leave cores idle
+    segments_per_worker = 4
+
+    def __init__(self, open_decoder, frames, frame_index=None, workers=1, min_frames=32):
+        self.open_decoder = open_decoder
+        self.workers = max(1, workers) if frame_index else 1
+        self.segments = split_segments(frames, frame_index,
+                                       self.workers * self.segments_per_worker, min_frames)
+        self.workers = min(self.workers, len(self.segments))
+
+    def __iter__(self):
+        if self.workers <= 1:
+            decoder = self.open_decoder()
+            try:
+                for segment in self.segments:
+                    yield from decoder.read_run(segment)
+            finally:
+                decoder.close()
+            return
+        yield from self._iter_parallel()
+
+    def _iter_parallel(self):
+        metrics.gauge('decode_workers', self.workers)
+        queues = [queue.Queue(self.queue_frames) for _ in self.segments]
+        # A permit per segment decoded but not yet drained by the consumer
+        in_flight = threading.Semaphore(self.workers)
+        stop = threading.Event()
+        claim_lock = threading.Lock()
+        claimed = iter(range(len(self.segments)))
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker():
+            decoder = self.open_decoder()
+            # Share the cores between processes instead of oversubscribing them
+            decoder.threads = max(1, (os.cpu_count() or 1) // self.workers)
+            try:
+                while True:
+                    while not in_flight.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    with claim_lock:
+                        i = next(claimed, None)
+                    if i is None or stop.is_set():
+                        in_flight.release()
+                        return
+                    try:
+                        for item in decoder.read_run(self.segments[i]):
+                            if not put(queues[i], item):
+                                break
+                    except Exception as e:
+                        print(f"Failed to decode segment: {e}")
+                    finally:
+                        put(queues[i], None)
+            finally:
+                decoder.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        try:
+            for q in queues:
+                while True:
+                    item = q.get()
+                    if item is None:
+                        break
+                    yield item
+                in_flight.release()
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+
+# ============================================================
+# Frame Cache
+# ============================================================
+
+def image_nbytes(img):
+    """Approximate in-memory size of a decoded image"""
+    return img.width * img.height * len(img.getbands())
+
+
+class FrameCache:
+    """LRU cache of decoded frames bounded by memory size"""
+
+    def __init__(self, limit_mb=512):
+        self.limit_bytes = int(limit_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def set_limit(self, limit_mb):
+        """Change the memory limit, evicting as needed"""
+        with self.lock:
+            self.limit_bytes = int(limit_mb * 1024 * 1024)
+            self._evict()
+
+    def get(self, key):
+        """Return cached item and mark it as recently used"""
+        with self.lock:
+            img = self.entries.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        """Insert an item, evicting least recently used ones over the limit"""
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= image_nbytes(old)
+            self.entries[key] = img
+            self.size_bytes += image_nbytes(img)
+            self._evict()
+
+    def _evict(self):
+        # Always keep the newest entry even if it alone exceeds the limit
+        while self.size_bytes > self.limit_bytes and len(self.entries) > 1:
+            _, img = self.entries.popitem(last=False)
+            self.size_bytes -= image_nbytes(img)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (statistics are kept)"""
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        """Return cache statistics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'size_mb': self.size_bytes / (1024 * 1024),
+                'limit_mb': self.limit_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class SpillFile:
+    """Ring buffer of byte strings in a scratch file, read back through mmap.
+
+    Entries are appended until the file reaches limit_bytes, then writing
+    wraps to the start and overwrites the oldest entries. The file is
+    created on first use in directory and deleted when closed.
+    """
+
+    def __init__(self, directory, limit_bytes):
+        self.directory = directory
+        self.limit_bytes = limit_bytes
+        self.file = None
+        self.map = None
+        self.pos = 0
+        self.size_bytes = 0
+        self.entries = OrderedDict()  # key -> (offset, length, meta), oldest write first
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop_oldest(self):
+        _, (_, length, _) = self.entries.popitem(last=False)
+        self.size_bytes -= length
+
+    def put(self, key, data, meta=None):
+        """Store data under key; returns how many entries were overwritten, or None if it cannot fit"""
+        length = len(data)
+        self.discard(key)
+        if length > self.limit_bytes:
+            return None
+        if self.file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = tempfile.TemporaryFile(prefix='spill_', dir=self.directory)
+
+        dropped = 0
+        if self.pos + length > self.limit_bytes:
+            # Entries past the write head are older than all of those before it
+            while self.entries and next(iter(self.entries.values()))[0] >= self.pos:
+                self._drop_oldest()
+                dropped += 1
+            self.pos = 0
+        while self.entries:
+            offset, size, _ = next(iter(self.entries.values()))
+            if offset >= self.pos + length or offset + size <= self.pos:
+                break
+            self._drop_oldest()
+            dropped += 1
+
+        self.file.seek(self.pos)
+        self.file.write(data)
+        self.file.flush()
+        self.entries[key] = (self.pos, length, meta)
+        self.pos += length
+        self.size_bytes += length
+        return dropped
+
+    @metrics.timed('cache_spill_read')
+    def pop(self, key):
+        """Remove key and return (data, meta), or None"""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        offset, length, meta = entry
+        self.size_bytes -= length
+        end = offset + length
+        if self.map is None or len(self.map) < end:
+            # The file has grown since it was mapped
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map[offset:end], meta
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+    def clear(self):
+        """Forget all entries; the file is kept and overwritten from the start"""
+        self.entries.clear()
+        self.pos = 0
+        self.size_bytes = 0
+
+    def close(self):
+        self.clear()
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TieredFrameCache:
+    """Frame cache in three tiers; least recently used frames move down a tier.
+
+    hot holds decoded images up to limit_mb. Frames evicted from it are
+    compressed with zlib (level 1) on a background thread into warm, kept
+    in memory up to warm_limit_mb of compressed data; until then they wait
+    uncompressed. If more than pending_fraction of limit_mb is waiting, the
+    oldest go straight to cold uncompressed, or without a cold tier are
+    compressed by the caller. Frames evicted from warm are spilled to a
+    SpillFile in spill_dir (cold) up to cold_limit_mb. A hit in warm or cold decompresses the frame and moves
+    it back to hot. Hits and the time spent restoring frames are counted
+    per tier; see stats().
+    """
+
+    compress_level = 1
+    pending_fraction = 0.25
+
+    def __init__(self, limit_mb=512, warm_limit_mb=256, cold_limit_mb=1024, spill_dir=None):
+        self.limit_bytes = int(limit_mb * 1024 * 1024)
+        self.warm_limit_bytes = int(warm_limit_mb * 1024 * 1024)
+        self.hot = OrderedDict()
+        self.hot_bytes = 0
+        self.pending = OrderedDict()  # demoted from hot, not compressed yet
+        self.pending_bytes = 0
+        self.warm = OrderedDict()  # key -> (data, size, mode)
+        self.warm_bytes = 0
+        self.warm_raw_bytes = 0
+        self.cold = None
+        if spill_dir and cold_limit_mb > 0:
+            self.cold = SpillFile(spill_dir, int(cold_limit_mb * 1024 * 1024))
+        self.hits = {'hot': 0, 'warm': 0, 'cold': 0}
+        self.restore_seconds = {'warm': 0.0, 'cold': 0.0}
+        self.demotions = {'warm': 0, 'cold': 0}
+        self.compress_seconds = 0.0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.worker = None
+        self.stopping = False
+
+    def set_limit(self, limit_mb):
+        """Change the hot tier limit, demoting frames as needed"""
+        with self.lock:
+            self.limit_bytes = int(limit_mb * 1024 * 1024)
+            self._evict_hot()
+
+    def get(self, key):
+        """Return a cached frame from any tier and make it the most recently used"""
+        with self.lock:
+            img = self.hot.get(key)
+            if img is not None:
+                self.hot.move_to_end(key)
+                self.hits['hot'] += 1
+                return img
+            img = self.pending.pop(key, None)
+            if img is not None:
+                self.pending_bytes -= image_nbytes(img)
+                self.hits['hot'] += 1
+                self._put_hot(key, img)
+                return img
+
+            start = time.perf_counter()
+            tier = 'warm'
+            item = self.warm.pop(key, None)
+            if item is not None:
+                self._forget_warm(item)
+            elif self.cold is not None and key in self.cold:
+                tier = 'cold'
+                try:
+                    data, (size, mode, compressed) = self.cold.pop(key)
+                    item = (data, size, mode)
+                    if not compressed:
+                        img = Image.frombytes(mode, size, data)
+                except (OSError, ValueError) as e:
+                    print(f"Failed to read spilled frame: {e}")
+            if item is None:
+                self.misses += 1
+                return None
+
+            if img is None:
+                data, size, mode = item
+                with metrics.timed('cache_decompress'):
+                    img = Image.frombytes(mode, size, zlib.decompress(data))
+            self.restore_seconds[tier] += time.perf_counter() - start
+            self.hits[tier] += 1
+            self._put_hot(key, img)
+            return img
+
+    def put(self, key, img):
+        """Insert a frame into hot, demoting least recently used frames over the limit"""
+        with self.lock:
+            self._discard(key)
+            self._put_hot(key, img)
+
+    def _discard(self, key):
+        img = self.hot.pop(key, None)
+        if img is not None:
+            self.hot_bytes -= image_nbytes(img)
+        img = self.pending.pop(key, None)
+        if img is not None:
+            self.pending_bytes -= image_nbytes(img)
+        item = self.warm.pop(key, None)
+        if item is not None:
+            self._forget_warm(item)
+        if self.cold is not None:
+            self.cold.discard(key)
+
+    def _put_hot(self, key, img):
+        self.hot[key] = img
+        self.hot_bytes += image_nbytes(img)
+        self._evict_hot()
+
+    def _evict_hot(self):
+        # Always keep the newest entry even if it alone exceeds the limit
+        while self.hot_bytes > self.limit_bytes and len(self.hot) > 1:
+            key, img = self.hot.popitem(last=False)
+            self.hot_bytes -= image_nbytes(img)
+            if self.warm_limit_bytes <= 0 and self.cold is None:
+                self.evictions += 1
+                continue
+            self.pending[key] = img
+            self.pending_bytes += image_nbytes(img)
+
+        # Compression is falling behind: spilling raw is cheaper than compressing
+        while self.pending_bytes > self.limit_bytes * self.pending_fraction and len(self.pending) > 1:
+            key, img = self.pending.popitem(last=False)
+            self.pending_bytes -= image_nbytes(img)
+            dropped = self._spill(key, img.tobytes(), img.size, img.mode, compressed=False)
+            if dropped is not None:
+                self.evictions += dropped
+                self.demotions['cold'] += 1
+                continue
+            start = time.perf_counter()
+            with metrics.timed('cache_compress'):
+                data = zlib.compress(img.tobytes(), self.compress_level)
+            self.compress_seconds += time.perf_counter() - start
+            self._add_warm(key, (data, img.size, img.mode))
+        if self.pending:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._compress_loop, daemon=True)
+                self.worker.start()
+            self.wake.notify()
+
+    def _compress_loop(self):
+        """Background thread: move pending frames into warm"""
+        with self.lock:
+            while True:
+                while not self.pending and not self.stopping:
+                    self.wake.wait()
+                if self.stopping:
+                    self.worker = None
+                    return
+                key, img = next(iter(self.pending.items()))
+
+                self.lock.release()
+                try:
+                    start = time.perf_counter()
+                    with metrics.timed('cache_compress'):
+                        data = zlib.compress(img.tobytes(), self.compress_level)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    self.lock.acquire()
+
+                if self.pending.get(key) is not img:
+                    continue  # taken back into hot or dropped meanwhile
+                del self.pending[key]
+                self.pending_bytes -= image_nbytes(img)
+                self.compress_seconds += elapsed
+                self._add_warm(key, (data, img.size, img.mode))
+
+    def _add_warm(self, key, item):
+        data, size, mode = item
+        self.warm[key] = item
+        self.warm_bytes += len(data)
+        self.warm_raw_bytes += size[0] * size[1] * Image.getmodebands(mode)
+        self.demotions['warm'] += 1
+
+        while self.warm_bytes > self.warm_limit_bytes and self.warm:
+            key, item = self.warm.popitem(last=False)
+            self._forget_warm(item)
+            dropped = self._spill(key, *item)
+            if dropped is None:
+                self.evictions += 1
+            else:
+                self.evictions += dropped
+                self.demotions['cold'] += 1
+
+    def _spill(self, key, data, size, mode, compressed=True):
+        if self.cold is None:
+            return None
+        try:
+            return self.cold.put(key, data, (size, mode, compressed))
+        except OSError as e:
+            print(f"Failed to spill frame: {e}")
+            return None
+
+    def _forget_warm(self, item):
+        data, size, mode = item
+        self.warm_bytes -= len(data)
+        self.warm_raw_bytes -= size[0] * size[1] * Image.getmodebands(mode)
+
+    def clear(self):
+        """Drop all entries (statistics are kept)"""
+        with self.lock:
+            self.hot.clear()
+            self.pending.clear()
+            self.warm.clear()
+            self.hot_bytes = self.pending_bytes = self.warm_bytes = self.warm_raw_bytes = 0
+            if self.cold is not None:
+                self.cold.clear()
+
+    def close(self):
+        """Drop all entries, stop the compression thread and delete the spill file"""
+        with self.lock:
+            worker = self.worker
+            self.stopping = True
+            self.wake.notify()
+        if worker:
+            worker.join()
+        self.clear()
+        with self.lock:
+            self.stopping = False
+            if self.cold is not None:
+                self.cold.close()
+
+    def stats(self):
+        """Return cache statistics, totals plus a breakdown per tier"""
+        mb = 1024 * 1024
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+
+            def tier(name, entries, size_bytes, limit_bytes):
+                data = {
+                    'entries': entries,
+                    'size_mb': size_bytes / mb,
+                    'limit_mb': limit_bytes / mb,
+                    'hits': self.hits[name],
+                    'hit_ratio': self.hits[name] / lookups if lookups else 0.0,
+                }
+                if name in self.restore_seconds:
+                    data['demotions'] = self.demotions[name]
+                    data['restore_ms'] = (self.restore_seconds[name] * 1000 / self.hits[name]
+                                          if self.hits[name] else 0.0)
+                return data
+
+            cold = self.cold
+            tiers = {
+                'hot': tier('hot', len(self.hot), self.hot_bytes, self.limit_bytes),
+                'warm': tier('warm', len(self.warm), self.warm_bytes, self.warm_limit_bytes),
+                'cold': tier('cold', 0, 0, 0) if cold is None else
+                        tier('cold', len(cold), cold.size_bytes, cold.limit_bytes),
+            }
+            tiers['hot']['pending'] = len(self.pending)
+            tiers['warm']['compress_ms'] = (self.compress_seconds * 1000 / self.demotions['warm']
+                                            if self.demotions['warm'] else 0.0)
+            tiers['warm']['ratio'] = self.warm_raw_bytes / self.warm_bytes if self.warm_bytes else 0.0
+            return {
+                'entries': self._count(),
+                'size_mb': (self.hot_bytes + self.pending_bytes + self.warm_bytes) / mb,
+                'limit_mb': self.limit_bytes / mb,
+                'hits': hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': hits / lookups if lookups else 0.0,
+                'tiers': tiers,
+            }
+
+    def __contains__(self, key):
+        with self.lock:
+            return (key in self.hot or key in self.pending or key in self.warm
+                    or (self.cold is not None and key in self.cold))
+
+    def __len__(self):
+        with self.lock:
+            return self._count()
+
+    def _count(self):
+        return len(self.hot) + len(self.pending) + len(self.warm) + (len(self.cold) if self.cold is not None else 0)
+
+
+# ============================================================
+# Persistent Cache
+# ============================================================
+
+def default_cache_dir():
+    """Per-user directory for the persistent cache"""
+    path = os.environ.get('RONVIDEO_CACHE_DIR')
+    if path:
+        return path
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, 'RonVideo2Pic', 'cache')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ronvideo2pic')
+
+
+class DiskCache:
+    """Cache shared across sessions with one directory per video.
+
+    Videos are keyed by path, size and mtime. When the total size exceeds
+    the limit, whole videos are evicted, least recently opened first.
+    """
+
+    # Bumped when cached frame numbering changes; older entries are never
+    # opened again and age out through eviction
+    format_version = 2
+
+    def __init__(self, root=None, limit_mb=2048):
+        self.root = root or default_cache_dir()
+        self.limit_bytes = int(limit_mb * 1024 * 1024)
+        self.size_bytes = None
+        self.lock = threading.Lock()
+
+    def video_key(self, video_path):
+        st = os.stat(video_path)
+        raw = f"{os.path.abspath(video_path)}|{st.st_size}|{st.st_mtime_ns}|{self.format_version}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def open(self, video_path):
+        """Open (or create) the cache entry of a video"""
+        try:
+            directory = os.path.join(self.root, self.video_key(video_path))
+            os.makedirs(directory, exist_ok=True)
+            return VideoCacheEntry(self, directory)
+        except Exception as e:
+            print(f"Failed to open cache: {e}")
+            return None
+
+    def _entries(self):
+        """(last_used, size, directory) for every cached video"""
+        entries = []
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            size = 0
+            last_used = 0
+            for filename in os.listdir(directory):
+                try:
+                    st = os.stat(os.path.join(directory, filename))
+                except OSError:
+                    continue
+                size += st.st_size
+                if filename == VideoCacheEntry.meta_name:
+                    last_used = st.st_mtime
+            entries.append((last_used, size, directory))
+        return entries
+
+    def reserve(self, nbytes, keep):
+        """Make room for nbytes more data, evicting other videos.
+
+        Returns False if the video in `keep` alone would exceed the limit.
+        """
+        with self.lock:
+            if self.size_bytes is None:
+                self.size_bytes = sum(size for _, size, _ in self._entries())
+
+            if self.size_bytes + nbytes > self.limit_bytes:
+                for _, size, directory in sorted(self._entries()):
+                    if self.size_bytes + nbytes <= self.limit_bytes:
+                        break
+                    if os.path.normcase(directory) == os.path.normcase(keep):
+                        continue
+                    shutil.rmtree(directory, ignore_errors=True)
+                    self.size_bytes -= size
+
+            if self.size_bytes + nbytes > self.limit_bytes:
+                return False
+            self.size_bytes += nbytes
+            return True
+
+
+class VideoCacheEntry:
+    """Cached metadata and preview frames of one video"""
+
+    meta_name = 'meta.json'
+
+    def __init__(self, cache, directory):
+        self.cache = cache
+        self.directory = directory
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def load_meta(self):
+        """Return (video_info, frame_index) saved by an earlier session, or None"""
+        path = os.path.join(self.directory, self.meta_name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(path)
+            index = FrameIndex.from_dict(meta['index']) if meta.get('index') else None
+            return meta['video_info'], index
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_meta(self, video_info, frame_index):
+        meta = {
+            'video_info': video_info,
+            'index': frame_index.to_dict() if frame_index else None,
+        }
+        data = json.dumps(meta).encode('utf-8')
+        if not self.cache.reserve(len(data), self.directory):
+            return
+        try:
+            with open(os.path.join(self.directory, self.meta_name), 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to save cache metadata: {e}")
+
+    def load_filmstrip(self, tile_height):
+        """Filmstrip saved by an earlier session, or None"""
+        base = os.path.join(self.directory, f'filmstrip_{tile_height}')
+        try:
+            with open(base + '.json', 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            with Image.open(base + '.jpg') as sheet:
+                sheet = sheet.convert('RGB')
+            return Filmstrip(sheet, tuple(layout['tile_size']), layout['times'], layout['columns'])
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Failed to load cached filmstrip: {e}")
+            return None
+
+    def save_filmstrip(self, filmstrip):
+        base = os.path.join(self.directory, f'filmstrip_{filmstrip.tile_size[1]}')
+        try:
+            # JPEG keeps the sheet small; the tiles are only ever shown tiny
+            sheet = io.BytesIO()
+            filmstrip.sheet.save(sheet, 'JPEG', quality=80)
+            layout = json.dumps({
+                'tile_size': filmstrip.tile_size,
+                'columns': filmstrip.columns,
+                'times': filmstrip.times,
+            }).encode('utf-8')
+            if not self.cache.reserve(sheet.tell() + len(layout), self.directory):
+                return
+            with open(base + '.jpg', 'wb') as f:
+                f.write(sheet.getvalue())
+            with open(base + '.json', 'wb') as f:
+                f.write(layout)
+        except OSError as e:
+            print(f"Failed to save filmstrip: {e}")
+
+    def load_scenes(self, frame_count):
+        """Scene analysis saved by an earlier session, or None"""
+        try:
+            with open(os.path.join(self.directory, 'scenes.bin'), 'rb') as f:
+                return SceneAnalysis.from_bytes(f.read(), frame_count)
+        except OSError:
+            return None
+
+    def save_scenes(self, analysis):
+        data = analysis.to_bytes()
+        if not self.cache.reserve(len(data), self.directory):
+            return
+        try:
+            with open(os.path.join(self.directory, 'scenes.bin'), 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to save scene analysis: {e}")
+
+    def _store(self, size, frame_count):
+        with self.lock:
+            store = self.stores.get(size)
+            if store is None:
+                store = FrameStore(os.path.join(self.directory, 'frames_{}x{}'.format(*size)),
+                                   size, frame_count)
+                self.stores[size] = store
+            return store
+
+    def get_frame(self, size, frame_number, frame_count):
+        """Cached preview frame at the given size, or None"""
+        try:
+            return self._store(size, frame_count).get(frame_number)
+        except Exception as e:
+            print(f"Failed to read cached frame: {e}")
+            return None
+
+    def put_frame(self, size, frame_number, frame_count, img):
+        try:
+            store = self._store(size, frame_count)
+            if frame_number in store or not self.cache.reserve(store.frame_bytes, self.directory):
+                return
+            store.put(frame_number, img)
+        except Exception as e:
+            print(f"Failed to write cached frame: {e}")
+
+    def close(self):
+        with self.lock:
+            for store in self.stores.values():
+                store.close()
+            self.stores.clear()
+
+
+class FrameStore:
+    """Append-only raw rgb24 frame file read through mmap.
+
+    A companion .idx file holds one int32 slot number per frame
+    (-1 when the frame is not stored yet).
+    """
+
+    def __init__(self, base_path, size, frame_count):
+        self.size = size
+        self.frame_bytes = size[0] * size[1] * 3
+        self.frame_count = frame_count
+        self.lock = threading.Lock()
+
+        idx_path = base_path + '.idx'
+        idx_bytes = frame_count * 4
+        if not os.path.exists(idx_path) or os.path.getsize(idx_path) != idx_bytes:
+            with open(idx_path, 'wb') as f:
+                f.write(b'\xff' * idx_bytes)
+            with open(base_path + '.bin', 'wb'):
+                pass
+        self.idx_file = open(idx_path, 'r+b')
+        self.slots = mmap.mmap(self.idx_file.fileno(), idx_bytes) if idx_bytes else None
+        self.data_file = open(base_path + '.bin', 'r+b')
+        self.data_map = None
+
+    def _slot(self, frame_number):
+        if not self.slots or not 0 <= frame_number < self.frame_count:
+            return -1
+        return struct.unpack_from('<i', self.slots, frame_number * 4)[0]
+
+    def __contains__(self, frame_number):
+        with self.lock:
+            return self._slot(frame_number) >= 0
+
+    @metrics.timed('disk_read')
+    def get(self, frame_number):
+        with self.lock:
+            slot = self._slot(frame_number)
+            if slot < 0:
+                return None
+            offset = slot * self.frame_bytes
+            end = offset + self.frame_bytes
+            if self.data_map is None or len(self.data_map) < end:
+                # The file has grown since it was mapped
+                if self.data_map is not None:
+                    self.data_map.close()
+                self.data_map = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(self.data_map) < end:
+                    return None
+            data = self.data_map[offset:end]
+        return Image.frombuffer('RGB', self.size, data, 'raw', 'RGB', 0, 1)
+
+    @metrics.timed('disk_write')
+    def put(self, frame_number, img):
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        data = img.tobytes()
+        if len(data) != self.frame_bytes or not 0 <= frame_number < self.frame_count:
+            return
+        with self.lock:
+            if self._slot(frame_number) >= 0:
+                return
+            # Round up so a torn write from an earlier crash cannot misalign slots
+            self.data_file.seek(0, os.SEEK_END)
+            slot = -(-self.data_file.tell() // self.frame_bytes)
+            self.data_file.seek(slot * self.frame_bytes)
+            self.data_file.write(data)
+            self.data_file.flush()
+            struct.pack_into('<i', self.slots, frame_number * 4, slot)
+
+    def close(self):
+        with self.lock:
+            if self.data_map is not None:
+                self.data_map.close()
+                self.data_map = None
+            if self.slots is not None:
+                self.slots.close()
+                self.slots = None
+            self.data_file.close()
+            self.idx_file.close()
+
+
+# ============================================================
+# Frame Prefetcher
+# ============================================================
+
+class FramePrefetcher:
+    """Background worker that decodes frames ahead of the playhead into the cache.
+
+    It owns its own FrameDecoder so sequential read-ahead is never
+    interrupted by random seeks made on the UI thread. With a video cache
+    entry, frames are read from and written to the persistent cache too.
+    """
+
+    def __init__(self, decoder, frame_cache, total_frames, video_cache=None):
+        self.decoder = decoder
+        self.frame_cache = frame_cache
+        self.total_frames = total_frames
+        self.video_cache = video_cache
+        self.size = (decoder.width, decoder.height)
+        self.position = 0
+        self.direction = 1
+        self.count = 0
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, frame_number, direction=1, count=16):
+        """Prefetch count frames starting at frame_number in the given direction"""
+        with self.cond:
+            self.position = frame_number
+            self.direction = direction
+            self.count = count
+            self.cond.notify()
+
+    def _window(self):
+        if self.direction >= 0:
+            return range(max(0, self.position), min(self.total_frames, self.position + self.count))
+        # Backward windows are still decoded in ascending order so the pipe streams forward
+        return range(max(0, self.position - self.count + 1), min(self.total_frames, self.position + 1))
+
+    def _next_missing(self):
+        for frame in self._window():
+            if frame not in self.frame_cache:
+                return frame
+        return None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                frame = None
+                while self.running:
+                    frame = self._next_missing()
+                    if frame is not None:
+                        break
+                    self.cond.wait()
+                if not self.running:
+                    break
+
+            img = self._load(frame)
+            with self.cond:
+                if not self.running:
+                    break  # stopped mid-decode; the caches may already be cleared or closed
+                if img is None:
+                    # Past the real end of stream; idle until the next request
+                    self.count = 0
+                else:
+                    self.frame_cache.put(frame, img)
+
+        self.decoder.close()
+
+    def _load(self, frame):
+        if self.video_cache:
+            img = self.video_cache.get_frame(self.size, frame, self.total_frames)
+            if img is not None:
+                return img
+        img = self.decoder.read_frame(frame)
+        if img is not None and self.video_cache:
+            with self.cond:
+                if self.running:
+                    self.video_cache.put_frame(self.size, frame, self.total_frames, img)
+        return img
+
+    def stop(self):
+        """Stop the worker thread"""
+        with self.cond:
+            self.running = False
+            self.decoder.abort()
+            self.cond.notify()
+        self.thread.join(timeout=2)
+
+
+class ScrubPreviewer:
+    """Background keyframe previews for slider scrubbing.
+
+    Only the latest request is decoded: a new target replaces any pending
+    one, and a running decode for a different keyframe is aborted. With
+    fast=True each preview is the nearest keyframe, decoded at the
+    decoder's (reduced) size and kept in a small cache, so scrubbing back
+    over the same stretch shows it instantly.
+    """
+
+    def __init__(self, decoder, frame_index=None, fast=True, cache_limit_mb=32):
+        self.decoder = decoder
+        self.frame_index = frame_index
+        self.fast = fast
+        self.cache = FrameCache(limit_mb=cache_limit_mb)
+        self.target = None
+        self.busy_frame = None
+        self.result = None
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _key(self, frame_number):
+        """Frame that a preview for frame_number actually shows"""
+        if self.fast and self.frame_index and frame_number < self.frame_index.frame_count:
+            return self.frame_index.nearest_keyframe(frame_number)
+        return frame_number
+
+    def request(self, frame_number):
+        """Ask for a preview of frame_number.
+
+        Returns (shown_frame, image) straight away if it is cached;
+        otherwise schedules a decode and returns None (see take()).
+        """
+        key = self._key(frame_number)
+        img = self.cache.get(key)
+        with self.cond:
+            if img is not None:
+                self.target = None
+                return key, img
+            self.target = frame_number
+            if self.busy_frame is not None and self.busy_frame != key:
+                # Superseded: let the worker move on to the new target
+                metrics.count('scrub_aborted')
+                self.decoder.abort()
+            self.cond.notify()
+        return None
+
+    def take(self):
+        """Latest finished preview as (shown_frame, image), or None"""
+        with self.cond:
+            result, self.result = self.result, None
+            return result
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and self.target is None:
+                    self.cond.wait()
+                if not self.running:
+                    break
+                frame, self.target = self.target, None
+                key = self.busy_frame = self._key(frame)
+
+            with metrics.timed('scrub_preview'):
+                if self.fast:
+                    shown, img = self.decoder.read_keyframe(frame)
+                else:
+                    shown, img = frame, self.decoder.read_frame(frame)
+
+            with self.cond:
+                self.busy_frame = None
+                # Cached under the key request() looks up; a preview of any
+                # other frame would be shown for the wrong stretch
+                if img is not None and shown == key:
+                    self.cache.put(key, img)
+                    self.result = (key, img)
+
+        self.decoder.close()
+
+    def stop(self):
+        """Stop the worker thread"""
+        with self.cond:
+            self.running = False
+            self.decoder.abort()
+            self.cond.notify()
+        self.thread.join(timeout=2)
+
+
+# ============================================================
+# Filmstrip
+# ============================================================
+
+class Filmstrip:
+    """Keyframe thumbnails of a video packed into one sprite sheet.
+
+    Tiles are laid out row by row, `columns` to a row; times holds the
+    timestamp (seconds from the start of the file) of each tile. Tiles are
+    only cut out of the sheet for the slots being drawn, so the cost of
+    rendering depends on the strip width, not on the video length.
+    """
+
+    columns = 32
+
+    def __init__(self, sheet, tile_size, times, columns=None):
+        self.sheet = sheet
+        self.tile_size = tile_size
+        self.times = times
+        if columns:
+            self.columns = columns
+
+    @classmethod
+    def from_tiles(cls, tiles, times):
+        """Pack equally sized tiles into a new sprite sheet"""
+        tile_w, tile_h = tiles[0].size
+        columns = min(cls.columns, len(tiles))
+        rows = -(-len(tiles) // columns)
+        sheet = Image.new('RGB', (columns * tile_w, rows * tile_h))
+        for i, tile in enumerate(tiles):
+            sheet.paste(tile, ((i % columns) * tile_w, (i // columns) * tile_h))
+        return cls(sheet, (tile_w, tile_h), list(times), columns)
+
+    def __len__(self):
+        return len(self.times)
+
+    def tile(self, i):
+        """Thumbnail i, cut out of the sheet"""
+        tile_w, tile_h = self.tile_size
+        x, y = (i % self.columns) * tile_w, (i // self.columns) * tile_h
+        return self.sheet.crop((x, y, x + tile_w, y + tile_h))
+
+    def tile_at(self, seconds):
+        """Index of the thumbnail shown at a time: the last one at or before it"""
+        return max(0, bisect.bisect_right(self.times, seconds) - 1)
+
+    @metrics.timed('filmstrip_render')
+    def render(self, start, end, width):
+        """Draw the [start, end] time range into a strip width pixels wide.
+
+        Returns (image, tiles) where tiles[k] is the thumbnail drawn in
+        the k-th slot of tile width.
+        """
+        tile_w, tile_h = self.tile_size
+        strip = Image.new('RGB', (max(1, width), tile_h))
+        span = max(end - start, 1e-6)
+        tiles = []
+        for x in range(0, width, tile_w):
+            # Each slot shows the keyframe in effect at its centre
+            i = self.tile_at(start + (x + tile_w / 2) / width * span)
+            strip.paste(self.tile(i), (x, 0))
+            tiles.append(i)
+        return strip, tiles
+
+
+# ============================================================
+# Scene Detection
+# ============================================================
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class SceneScorer:
+    """Incremental scene-change score and difference hash of each frame.
+
+    The score follows ffmpeg's scene filter: the mean absolute difference
+    to the previous frame, minus how much that difference changed, so
+    steady motion scores low and a cut scores high.
+    """
+
+    def __init__(self):
+        self.scores = array('f')
+        self.hashes = array('Q')
+        self.prev = None
+        self.prev_mafd = 0.0
+
+    def add(self, img):
+        """Score one grayscale frame of SceneAnalysis.size"""
+        score = 0.0
+        if self.prev is not None:
+            # Mean of the difference image, computed by a 1x1 box filter in C
+            diff = ImageChops.difference(img, self.prev).convert('F')
+            mafd = diff.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+            score = min(mafd, abs(mafd - self.prev_mafd)) / 100
+            self.prev_mafd = mafd
+        self.prev = img
+        self.scores.append(min(score, 1.0))
+
+        # dHash: 8x8 bits of "brighter than the pixel to the right"
+        px = img.resize((9, 8), Image.Resampling.BOX).tobytes()
+        h = 0
+        for i in range(72):
+            if i % 9 != 8:
+                h = h << 1 | (px[i] > px[i + 1])
+        self.hashes.append(h)
+
+
+class SceneAnalysis:
+    """Per-frame scene-change scores and perceptual hashes of one video.
+
+    scores[i] (0..1) measures how much frame i differs from frame i - 1;
+    hashes[i] is a 64-bit difference hash used to spot near-duplicates.
+    """
+
+    # Frames are analysed at this size, in grayscale
+    size = (64, 48)
+    # A score above this starts a new shot
+    threshold = 0.3
+    # Shots whose first frames' hashes differ in at most this many bits are duplicates
+    max_distance = 6
+
+    def __init__(self, scores, hashes):
+        self.scores = scores
+        self.hashes = hashes
+
+    def __len__(self):
+        return len(self.scores)
+
+    def scene_frames(self, threshold=None, min_gap=1):
+        """First frame of every shot; cuts closer than min_gap frames count once"""
+        threshold = self.threshold if threshold is None else threshold
+        frames = [0]
+        for i in range(1, len(self.scores)):
+            if self.scores[i] > threshold and i - frames[-1] >= min_gap:
+                frames.append(i)
+        return frames
+
+    def drop_duplicates(self, frames, max_distance=None, keep=()):
+        """frames without those that look like an earlier kept frame (or one in keep)"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        kept_hashes = [self.hashes[f] for f in keep if 0 <= f < len(self.hashes)]
+        result = []
+        for frame in frames:
+            h = self.hashes[frame]
+            if any(hamming(h, other) <= max_distance for other in kept_hashes):
+                continue
+            kept_hashes.append(h)
+            result.append(frame)
+        return result
+
+    def to_bytes(self):
+        # Native byte order: the cache never leaves this machine
+        return self.scores.tobytes() + self.hashes.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, frame_count):
+        """Decode to_bytes() output; None unless it covers exactly frame_count frames"""
+        scores, hashes = array('f'), array('Q')
+        split = frame_count * scores.itemsize
+        if not frame_count or len(data) != split + frame_count * hashes.itemsize:
+            return None
+        scores.frombytes(data[:split])
+        hashes.frombytes(data[split:])
+        return cls(scores, hashes)
+
+
+# ============================================================
+# Batch Export
+# ============================================================
+
+class FrameExporter:
+    """Export frames to image files on a pool of worker threads.
+
+    The frames are split at keyframes into segments (split_segments).
+    Each worker owns a full-resolution decoder and pulls segments that
+    are decoded in a single ffmpeg pass, so one worker's PNG/JPEG encode
+    overlaps the others' decoding. There is one worker per core unless
+    the memory limit allows fewer (parallel_workers), and the cores are
+    shared between the workers' ffmpeg processes.
+    """
+
+    chunk_size = 32
+    # More segments than workers, so a slow segment does not leave cores idle
+    segments_per_worker = 4
+
+    def __init__(self, ffmpeg, video_path, video_info, frame_index=None,
+                 workers=None, memory_limit_mb=512):
+        self.ffmpeg = ffmpeg
+        self.video_path = video_path
+        self.video_info = video_info
+        self.frame_index = frame_index
+        frame_bytes = video_info['width'] * video_info['height'] * 3
+        self.workers = parallel_workers(frame_bytes, memory_limit_mb, workers)
+        self.bytes_written = 0
+
+    def _chunks(self, frames):
+        """Segments of frames for one sequential decode each, split so all workers get work"""
+        return split_segments(frames, self.frame_index, self.workers * self.segments_per_worker,
+                              self.chunk_size)
+
+    def export(self, frames, folder, image_format='png', progress=None, cancel_event=None):
+        """Export frames to folder, return the number of files written.
+
+        progress(done, total) is called from worker threads; setting
+        cancel_event stops the export after the frames in flight. If a
+        worker fails (a decode error, a full disk, ...), the others stop and
+        its exception is raised here.
+        """
+        frames = sorted(frames)
+        total = len(frames)
+        chunks = list(self._chunks(frames))
+        self.bytes_written = 0
+        chunk_lock = threading.Lock()
+        count_lock = threading.Lock()
+        state = {'next': 0, 'done': 0, 'written': 0}
+        failed = threading.Event()
+        errors = []
+        save_kwargs = {'quality': 95} if image_format in ('jpg', 'jpeg') else {}
+
+        def report(processed, written, nbytes=0):
+            with count_lock:
+                state['done'] += processed
+                state['written'] += written
+                self.bytes_written += nbytes
+                done = state['done']
+            if progress:
+                progress(done, total)
+
+        def next_chunk():
+            with chunk_lock:
+                if state['next'] >= len(chunks):
+                    return None
+                chunk = chunks[state['next']]
+                state['next'] += 1
+                return chunk
+
+        workers = min(self.workers, len(chunks))
+        metrics.gauge('export_workers', workers)
+
+        def stopped():
+            return failed.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+        def worker():
+            decoder = None
+            try:
+                decoder = self.ffmpeg.open_decoder(self.video_path, self.video_info, self.frame_index)
+                if workers > 1:
+                    decoder.threads = max(1, (os.cpu_count() or 1) // workers)
+                while not stopped():
+                    chunk = next_chunk()
+                    if chunk is None:
+                        break
+                    delivered = 0
+                    for frame, img in decoder.read_run(chunk):
+                        path = os.path.join(folder, f"frame_{frame + 1:06d}.{image_format}")
+                        with metrics.timed('export_encode'):
+                            img.save(path, **save_kwargs)
+                        delivered += 1
+                        report(1, 1, os.path.getsize(path))
+                        if stopped():
+                            break
+                    else:
+                        # Frames past the real end of stream still count as processed
+                        if delivered < len(chunk):
+                            report(len(chunk) - delivered, 0)
+            except Exception as e:
+                with count_lock:
+                    errors.append(e)
+                failed.set()
+            finally:
+                if decoder:
+                    decoder.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return state['written']
+
+
+# ============================================================
+# Frame Selection
+# ============================================================
+
+class FrameSelection(MutableSet):
+    """Sorted set of frame numbers.
+
+    Membership is a bitmap indexed by frame number, and a Fenwick tree over
+    it counts the selected frames before any position. Adding, removing,
+    rank and lookup by position are O(log n), iteration is in frame order,
+    and whole ranges are added or removed at once.
+    """
+
+    def __init__(self, frames=(), capacity=1024):
+        self._bits = bytearray(max(1, capacity))
+        self._tree = array('l', [0]) * (len(self._bits) + 1)
+        self._count = 0
+        self.update(frames)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, frame):
+        return 0 <= frame < len(self._bits) and self._bits[frame] == 1
+
+    def __iter__(self):
+        bits = self._bits
+        frame = bits.find(1)
+        while frame != -1:
+            yield frame
+            frame = bits.find(1, frame + 1)
+
+    def __getitem__(self, position):
+        """The frame at position in sorted order"""
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError('selection index out of range')
+        tree = self._tree
+        size = len(tree) - 1
+        frame = 0
+        step = 1 << (size.bit_length() - 1)
+        while step:
+            if frame + step <= size and tree[frame + step] <= position:
+                frame += step
+                position -= tree[frame]
+            step >>= 1
+        return frame
+
+    def __repr__(self):
+        return f"FrameSelection({list(self)})"
+
+    def rank(self, frame):
+        """Number of selected frames before frame"""
+        tree = self._tree
+        i = min(max(frame, 0), len(tree) - 1)
+        count = 0
+        while i:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+    def index(self, frame):
+        """Position of a selected frame in sorted order"""
+        if frame not in self:
+            raise ValueError(f"{frame} is not selected")
+        return self.rank(frame)
+
+    def window(self, position, count):
+        """Up to count frames in sorted order starting at position"""
+        if position >= self._count or count <= 0:
+            return []
+        frames = [self[max(0, position)]]
+        bits = self._bits
+        while len(frames) < count:
+            frame = bits.find(1, frames[-1] + 1)
+            if frame == -1:
+                break
+            frames.append(frame)
+        return frames
+
+    def _update(self, frame, delta):
+        tree = self._tree
+        size = len(tree) - 1
+        i = frame + 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+        self._count += delta
+
+    def _rebuild(self):
+        size = len(self._bits)
+        tree = array('l', [0]) + array('l', iter(self._bits))
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._count = self._bits.count(1)
+
+    def _grow(self, stop):
+        if stop > len(self._bits):
+            self._bits.extend(bytes(max(stop, len(self._bits) * 2) - len(self._bits)))
+            self._rebuild()
+
+    def add(self, frame):
+        if frame < 0:
+            raise ValueError(f"frame number must not be negative: {frame}")
+        self._grow(frame + 1)
+        if not self._bits[frame]:
+            self._bits[frame] = 1
+            self._update(frame, 1)
+
+    def discard(self, frame):
+        if frame in self:
+            self._bits[frame] = 0
+            self._update(frame, -1)
+
+    def toggle(self, frame):
+        """Select frame if it is not selected, otherwise deselect it; returns the new state"""
+        if frame in self:
+            self.discard(frame)
+            return False
+        self.add(frame)
+        return True
+
+    def _set_range(self, start, stop, value):
+        changed = (stop - start) - self._bits.count(value, start, stop)
+        if not changed:
+            return
+        if changed * len(self._bits).bit_length() > len(self._bits):
+            # Rewriting the bitmap and rebuilding beats per-frame updates
+            self._bits[start:stop] = bytes([value]) * (stop - start)
+            self._rebuild()
+            return
+        delta = 1 if value else -1
+        bits = self._bits
+        for frame in range(start, stop):
+            if bits[frame] != value:
+                bits[frame] = value
+                self._update(frame, delta)
+
+    def add_range(self, start, stop):
+        """Select frames start..stop-1"""
+        start = max(0, start)
+        if stop > start:
+            self._grow(stop)
+            self._set_range(start, stop, 1)
+
+    def discard_range(self, start, stop):
+        """Deselect frames start..stop-1"""
+        start, stop = max(0, start), min(stop, len(self._bits))
+        if stop > start:
+            self._set_range(start, stop, 0)
+
+    def update(self, frames):
+        if isinstance(frames, range) and frames.step == 1:
+            self.add_range(frames.start, frames.stop)
+            return
+        for frame in frames:
+            self.add(frame)
+
+    def intersection_update(self, frames):
+        """Keep only the frames also in frames (a range is handled in bulk)"""
+        if isinstance(frames, range) and frames.step == 1:
+            self.discard_range(0, frames.start)
+            self.discard_range(frames.stop, len(self._bits))
+            return
+        keep = set(frames)
+        self.difference_update([frame for frame in self if frame not in keep])
+
+    def difference_update(self, frames):
+        for frame in frames:
+            self.discard(frame)
+
+    def clear(self):
+        self._bits = bytearray(len(self._bits))
+        self._tree = array('l', [0]) * (len(self._bits) + 1)
+        self._count = 0
+
+
+# ============================================================
+# Video Player Core
+# ============================================================
+
+class VideoPlayer:
+    """Video player core.
+
+    Interactive display uses frames decoded by ffmpeg at preview size
+    (preview_cache); exports use full-resolution frames (frame_cache).
+    Both compress what does not fit in memory; frame_cache also spills
+    to disk, while previews fall back to the persistent frame store.
+    The two caches are separate so they never evict each other.
+    """
+
+    def __init__(self, cache_limit_mb=512, preview_cache_limit_mb=256, disk_cache=None):
+        self.ffmpeg = FFmpegHelper()
+        # None: the shared cache directory; False: nothing is kept on disk
+        self.disk_cache = DiskCache() if disk_cache is None else disk_cache or None
+        self.video_cache = None
+        self.video_path = None
+        self.video_info = None
+        self.current_frame = 0
+        self.frame_index = None
+        self.decoder = None
+        self.preview_size = None
+        self.preview_decoder = None
+        self.prefetcher = None
+        self.scrubber = None
+        spill_dir = self.disk_cache.root if self.disk_cache else tempfile.gettempdir()
+        self.frame_cache = TieredFrameCache(limit_mb=cache_limit_mb, spill_dir=spill_dir)
+        self.preview_cache = TieredFrameCache(limit_mb=preview_cache_limit_mb,
+                                              warm_limit_mb=preview_cache_limit_mb / 2, cold_limit_mb=0)
+        self.selected_frames = FrameSelection()
+        # Seek mode per interactive operation; exports always decode exactly
+        self.seek_policy = {'scrub': 'fast', 'display': 'exact'}
+        # Maximum decode width of scrubbing previews
+        self.scrub_width = 320
+        # (source, resized) of the last scrubbing preview
+        self._scrub_fitted = None
+        # Height of filmstrip thumbnails
+        self.filmstrip_height = 48
+
+    def load_video(self, path):
+        """Load video file, blocking until its frame index is built"""
+        if not self.open_video(path):
+            return False
+        if not self.frame_index:
+            self.set_frame_index(self.ffmpeg.build_frame_index(path, self.video_info['start_time']))
+        return True
+
+    def probe(self, path):
+        """Return (video_cache, video_info, frame_index) for path.
+
+        Reads the disk cache, or runs ffprobe when the video is new (the
+        frame index is then None). Changes no player state, so it can run
+        on a worker thread; pass the result to open_video.
+        """
+        video_cache = self.disk_cache.open(path) if self.disk_cache else None
+        cached = video_cache.load_meta() if video_cache else None
+        if cached:
+            return (video_cache,) + tuple(cached)
+        return video_cache, self.ffmpeg.get_video_info(path), None
+
+    def open_video(self, path, probed=None):
+        """Open a video for display without waiting for its frame index"""
+        self.close_video()
+        self.video_path = path
+        self.video_cache, self.video_info, self.frame_index = probed or self.probe(path)
+        if self.video_info:
+            self.decoder = self.ffmpeg.open_decoder(path, self.video_info, self.frame_index)
+        return self.video_info is not None
+
+    def set_frame_index(self, frame_index):
+        """Switch to exact, index-based seeking once the frame index is built"""
+        if not frame_index or not self.video_info:
+            return
+        self.frame_index = frame_index
+        self.video_info['total_frames'] = frame_index.frame_count
+        if self.video_cache:
+            self.video_cache.save_meta(self.video_info, frame_index)
+
+        # Frames decoded by time-based seeking are dropped; they may be off by one
+        self._close_preview()
+        self.preview_cache.clear()
+        self.frame_cache.clear()
+        if self.decoder:
+            self.decoder.close()
+        self.decoder = self.ffmpeg.open_decoder(self.video_path, self.video_info, frame_index)
+        self.current_frame = min(self.current_frame, frame_index.frame_count - 1)
+        self.selected_frames.intersection_update(range(frame_index.frame_count))
+
+    def get_frame_image(self, frame_number):
+        """Get full-resolution image for specific frame"""
+        if not self.video_info:
+            return None
+
+        img = self.frame_cache.get(frame_number)
+        if img is not None:
+            return img
+
+        img = self.decoder.read_frame(frame_number)
+        if img is not None:
+            self.frame_cache.put(frame_number, img)
+            return img
+
+        return None
+
+    def set_preview_size(self, size):
+        """Switch the interactive decode path to a new display size"""
+        size = tuple(size)
+        if size == self.preview_size or not self.video_info:
+            return
+        self._close_preview()
+        self.preview_cache.clear()
+        self.preview_size = size
+        self.preview_decoder = self.ffmpeg.open_decoder(self.video_path, self.video_info,
+                                                        self.frame_index, size)
+        self.prefetcher = FramePrefetcher(
+            self.ffmpeg.open_decoder(self.video_path, self.video_info, self.frame_index, size),
+            self.preview_cache, self.video_info['total_frames'],
+            self.video_cache if self.frame_index else None)
+
+    @metrics.timed('preview')
+    def get_preview_image(self, frame_number, size):
+        """Get a frame decoded at preview size, persisted in the disk cache"""
+        if not self.video_info:
+            return None
+        self.set_preview_size(size)
+
+        img = self.preview_cache.get(frame_number)
+        if img is not None:
+            return img
+
+        # Only frames located through the index are persisted
+        video_cache = self.video_cache if self.frame_index else None
+        total = self.video_info['total_frames']
+        if video_cache:
+            img = video_cache.get_frame(self.preview_size, frame_number, total)
+
+        if img is None:
+            img = self.preview_decoder.read_frame(frame_number)
+            if img is None:
+                return None
+            if video_cache:
+                video_cache.put_frame(self.preview_size, frame_number, total, img)
+
+        self.preview_cache.put(frame_number, img)
+        return img
+
+    def cache_stats(self):
+        """Statistics of the in-memory frame caches"""
+        return {
+            'frame_cache': self.frame_cache.stats(),
+            'preview_cache': self.preview_cache.stats(),
+        }
+
+    def metrics_snapshot(self):
+        """Global metrics plus this player's cache statistics"""
+        return metrics.snapshot(caches=self.cache_stats())
+
+    def set_seek_policy(self, operation, mode):
+        """Choose 'fast' or 'exact' seeking for 'scrub' or 'display'"""
+        if operation not in self.seek_policy:
+            raise ValueError(f"Unknown operation {operation!r}; exports are always exact")
+        if mode not in SEEK_MODES:
+            raise ValueError(f"Unknown seek mode {mode!r}")
+        self.seek_policy[operation] = mode
+        if operation == 'scrub' and self.scrubber:
+            self.scrubber.stop()
+            self.scrubber = None
+
+    def get_display_image(self, frame_number, size, operation='display'):
+        """Preview for an interactive operation, honouring its seek policy.
+
+        Returns (frame_number, image) for the frame actually decoded: with
+        the 'fast' policy that is the keyframe nearest to frame_number.
+        """
+        if not self.video_info:
+            return frame_number, None
+        if self.seek_policy.get(operation) != 'fast' or frame_number in self.preview_cache:
+            return frame_number, self.get_preview_image(frame_number, size)
+
+        self.set_preview_size(size)
+        if self.frame_index:
+            keyframe = self.frame_index.nearest_keyframe(frame_number)
+            img = self.preview_cache.get(keyframe)
+            if img is not None:
+                return keyframe, img
+        shown, img = self.preview_decoder.read_keyframe(frame_number)
+        if img is not None:
+            self.preview_cache.put(shown, img)
+        return shown, img
+
+    def scrub_preview(self, frame_number, size):
+        """Request a scrubbing preview of frame_number for display at size.
+
+        Decoding happens on a background worker at no more than
+        scrub_width pixels wide, following seek_policy['scrub']. Returns
+        (shown_frame, image) at once if available, else None; poll
+        take_scrub_preview() for the result.
+        """
+        if not self.video_info:
+            return None
+        self.set_preview_size(size)
+        if self.scrubber is None:
+            width, height = self.preview_size
+            if width > self.scrub_width:
+                width, height = self.scrub_width, max(1, height * self.scrub_width // width)
+            decoder = self.ffmpeg.open_decoder(self.video_path, self.video_info, self.frame_index,
+                                               (width, height))
+            self.scrubber = ScrubPreviewer(decoder, self.frame_index,
+                                           fast=self.seek_policy['scrub'] == 'fast')
+        return self._fit_preview(self.scrubber.request(frame_number))
+
+    def take_scrub_preview(self):
+        """Finished scrubbing preview as (shown_frame, image), or None"""
+        if not self.scrubber:
+            return None
+        return self._fit_preview(self.scrubber.take())
+
+    def _fit_preview(self, result):
+        if result is None:
+            return None
+        frame, img = result
+        if img.size == self.preview_size:
+            return frame, img
+        # Repeated slider events usually land on the same keyframe: upscale it once
+        fitted = self._scrub_fitted
+        if fitted and fitted[0] is img and fitted[1].size == self.preview_size:
+            return frame, fitted[1]
+        resized = img.resize(self.preview_size, Image.Resampling.BILINEAR)
+        self._scrub_fitted = (img, resized)
+        return frame, resized
+
+    def create_exporter(self, workers=None):
+        """Batch exporter for the current video, bounded by the frame cache limit"""
+        return FrameExporter(self.ffmpeg, self.video_path, self.video_info, self.frame_index,
+                             workers=workers,
+                             memory_limit_mb=self.frame_cache.limit_bytes / (1024 * 1024))
+
+    def iter_frames(self, frames, size=None, scale_flags=None, workers=None, pix_fmt='rgb24'):
+        """Yield (frame_number, image) for frames in order, decoding each run in one pass.
+
+        Long ranges are split at keyframes and decoded by up to `workers`
+        processes at once (default: one per core, within the frame cache
+        limit).
+        """
+        width, height = size or (self.video_info['width'], self.video_info['height'])
+        workers = parallel_workers(width * height * PIX_FMTS[pix_fmt][1],
+                                   self.frame_cache.limit_bytes / (1024 * 1024), workers)
+
+        def open_decoder():
+            return self.ffmpeg.open_decoder(self.video_path, self.video_info, self.frame_index,
+                                            size, scale_flags, pix_fmt)
+
+        yield from SegmentDecoder(open_decoder, frames, self.frame_index, workers)
+
+    def frame_time(self, frame_number):
+        """Timestamp of a frame in seconds"""
+        if self.frame_index and 0 <= frame_number < self.frame_index.frame_count:
+            return self.frame_index.time_of(frame_number)
+        return frame_number / self.video_info['fps']
+
+    def frame_at_time(self, seconds):
+        """Frame nearest to a timestamp in seconds"""
+        if self.frame_index:
+            return self.frame_index.nearest_frame(seconds + self.frame_index.start_time)
+        total = self.video_info['total_frames']
+        return max(0, min(round(seconds * self.video_info['fps']), total - 1))
+
+    def load_filmstrip(self, progress=None, cancel_event=None):
+        """Keyframe filmstrip of the current video from the disk cache, or built in one pass.
+
+        Changes no player state, so it can run on a worker thread.
+        """
+        path, info, video_cache = self.video_path, self.video_info, self.video_cache
+        if not info:
+            return None
+        if video_cache:
+            filmstrip = video_cache.load_filmstrip(self.filmstrip_height)
+            if filmstrip:
+                return filmstrip
+        filmstrip = self.ffmpeg.build_filmstrip(path, info, self.filmstrip_height,
+                                                progress=progress, cancel_event=cancel_event)
+        if filmstrip and video_cache:
+            video_cache.save_filmstrip(filmstrip)
+        return filmstrip
+
+    def load_scenes(self, progress=None, cancel_event=None, workers=None):
+        """Scene analysis of the current video from the disk cache, or computed in one pass.
+
+        Changes no player state, so it can run on a worker thread.
+        """
+        path, info, video_cache = self.video_path, self.video_info, self.video_cache
+        if not info:
+            return None
+        if video_cache:
+            analysis = video_cache.load_scenes(info['total_frames'])
+            if analysis:
+                return analysis
+        analysis = self.ffmpeg.analyze_scenes(path, info, self.frame_index, workers,
+                                              progress=progress, cancel_event=cancel_event)
+        if analysis and video_cache and len(analysis) == info['total_frames']:
+            video_cache.save_scenes(analysis)
+        return analysis
+
+    def select_scenes(self, analysis, threshold=None, max_distance=None):
+        """Add the first frame of every shot to the selection, skipping near-duplicates.
+
+        Returns the frames that were added.
+        """
+        total = self.video_info['total_frames']
+        # Cuts within half a second of each other are one transition
+        min_gap = max(1, round(self.video_info['fps'] / 2))
+        frames = [f for f in analysis.scene_frames(threshold, min_gap) if f < total]
+        frames = analysis.drop_duplicates([f for f in frames if f not in self.selected_frames],
+                                          max_distance, keep=self.selected_frames)
+        self.selected_frames.update(frames)
+        return frames
+
+    def prefetch(self, frame_number, direction=1, count=16):
+        """Ask the background worker to decode preview frames ahead of frame_number"""
+        if not self.prefetcher:
+            return
+        # Never prefetch more than half the cache can hold, or the window evicts itself
+        frame_bytes = max(1, self.preview_size[0] * self.preview_size[1] * 3)
+        count = min(count, max(1, self.preview_cache.limit_bytes // frame_bytes // 2))
+        self.prefetcher.request(frame_number, direction, count)
+
+    def find_cached_frame(self, first, last):
+        """Return the newest frame in [first, last] whose preview is already decoded"""
+        for frame in range(last, first - 1, -1):
+            if frame in self.preview_cache:
+                return frame
+        return None
+
+    def _close_preview(self):
+        if self.scrubber:
+            self.scrubber.stop()
+            self.scrubber = None
+        self._scrub_fitted = None
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        if self.preview_decoder:
+            self.preview_decoder.close()
+            self.preview_decoder = None
+        self.preview_size = None
+
+    def close_video(self):
+        """Release the current video and forget its state"""
+        self.cleanup()
+        self.video_path = None
+        self.video_info = None
+        self.current_frame = 0
+        self.frame_cache.clear()
+        self.preview_cache.clear()
+        self.selected_frames.clear()
+        self.frame_index = None
+
+    def cleanup(self):
+        """Stop the decoders and prefetch worker"""
+        self._close_preview()
+        if self.decoder:
+            self.decoder.close()
+            self.decoder = None
+        if self.video_cache:
+            self.video_cache.close()
+            self.video_cache = None
+        self.frame_cache.close()
+        self.preview_cache.close()
+
+
+# ============================================================
+# Target-size GIF
+# ============================================================
+
+def report_frames(frames, total, progress=None, cancel_event=None):
+    """Yield the images of (frame_number, image) pairs, calling progress(done, total).
+
+    Stops early once cancel_event is set.
+    """
+    for done, (_, img) in enumerate(frames, 1):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        yield img
+        if progress:
+            progress(done, total)
+
+
+class GifSizeFitter:
+    """Choose width, frame skip and palette size so a GIF fits under max_kb.
+
+    Candidates are ranked from best to worst quality and sized from a small
+    sample of frames: the first frame is stored whole and every later one
+    as its change from the previous kept frame, as GifWriter does. The
+    sample is decoded once at the requested width; smaller widths and
+    palettes are derived from it and cached, so ranking candidates needs
+    no full encode. Widths are bisected rather than walked, and settings
+    that cannot beat the best candidate so far are never estimated. Only
+    the chosen candidate is encoded in full; if it still comes out too
+    large the estimates are corrected by the measured error and the search
+    runs again without it.
+    """
+
+    scales = (1.0, 0.85, 0.7, 0.6, 0.5, 0.4, 0.3)
+    skips = (1, 2, 3, 4)
+    palettes = (256, 128, 64, 32)
+    min_width = 64
+    sample_count = 8
+    max_attempts = 4
+    overhead_bytes = 64  # file header, loop extension and trailer
+    margin = 0.97
+
+    def __init__(self, player, frames, width, fps, max_kb, loop=0):
+        self.player = player
+        self.frames = sorted(frames)
+        self.width = width
+        self.fps = fps
+        self.max_bytes = int(max_kb * 1024)
+        self.loop = loop
+        self.samples = None
+        self.resized = {}
+        self.quantized = {}
+        self.frame_bytes = {}
+        self.delta_bytes = {}
+        self.estimates = {}
+
+    def _height(self, width):
+        info = self.player.video_info
+        return max(1, int(info['height'] * width / info['width']))
+
+    def _widths(self):
+        """(cost, width) from widest to narrowest"""
+        widths = []
+        for scale in self.scales:
+            width = int(self.width * scale)
+            if width < self.min_width and scale != 1.0:
+                continue
+            widths.append((1.0 - scale, width))
+        return widths
+
+    def _settings(self):
+        """(cost, skip, colors) from best to worst quality"""
+        ranked = []
+        for skip in self.skips:
+            if skip > 1 and len(self.frames) < skip * 2:
+                continue
+            for p, colors in enumerate(self.palettes):
+                ranked.append(((skip - 1) * 0.3 + p * 0.12, skip, colors))
+        ranked.sort(key=lambda item: (item[0], item[1], -item[2]))
+        return ranked
+
+    def _within(self, width, skip, colors, limit):
+        """Whether a candidate is estimated at most limit bytes.
+
+        Answered without a new estimate when a candidate already estimated
+        is at least as large in every respect and fits, or at most as large
+        and does not.
+        """
+        for (w, s, c), size in self.estimates.items():
+            if size <= limit and w >= width and s <= skip and c >= colors:
+                return True
+            if size > limit and w <= width and s >= skip and c <= colors:
+                return False
+        return self.estimate(width, skip, colors) <= limit
+
+    def _search(self, limit, tried):
+        """Best quality (width, skip, colors) estimated at most limit bytes, or None.
+
+        For a given skip and palette the size shrinks with the width, so
+        the widths are bisected instead of estimated one by one, and skip
+        and palette pairs that cannot beat the best candidate found so far
+        are not estimated at all.
+        """
+        best_cost, best = float('inf'), None
+        for base, skip, colors in self._settings():
+            widths = [(cost, width) for cost, width in self._widths()
+                      if base + cost < best_cost and (width, skip, colors) not in tried]
+            if not widths or not self._within(widths[-1][1], skip, colors, limit):
+                continue
+            lo, hi = 0, len(widths) - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._within(widths[mid][1], skip, colors, limit):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            cost, width = widths[lo]
+            best_cost, best = base + cost, (width, skip, colors)
+        return best
+
+    def _load_samples(self):
+        """Decode runs of consecutive selected frames spread over the selection.
+
+        Each run is long enough to measure the change to the next kept frame
+        at every skip, since GifWriter only stores that change. The runs
+        cover at most a third of a short selection; estimating from most of
+        its frames would cost as much as encoding them.
+        """
+        run = max(self.skips) + 1
+        count = max(1, min(self.sample_count, len(self.frames) // (run * 3)))
+        step = len(self.frames) / count
+        starts = sorted({int(i * step) for i in range(count)})
+        runs = [self.frames[k:k + run] for k in starts]
+        picks = sorted({frame for frames in runs for frame in frames})
+        size = (self.width, self._height(self.width))
+        images = dict(self.player.iter_frames(picks, size=size, scale_flags='lanczos'))
+        self.samples = []
+        for frames in runs:
+            # A run ends at the first frame that failed to decode
+            run_images = []
+            for frame in frames:
+                if frame not in images:
+                    break
+                run_images.append(images[frame])
+            if run_images:
+                self.samples.append(run_images)
+
+    def _sample_image(self, i, j, width):
+        key = (i, j, width)
+        img = self.resized.get(key)
+        if img is None:
+            img = self.samples[i][j]
+            if width != img.width:
+                img = img.resize((width, self._height(width)), Image.Resampling.LANCZOS)
+            self.resized[key] = img
+        return img
+
+    def _sample_frame(self, i, width, colors):
+        key = (i, width, colors)
+        frame = self.quantized.get(key)
+        if frame is None:
+            frame = quantize_gif_frame(self._sample_image(i, 0, width), colors)
+            self.quantized[key] = frame
+        return frame
+
+    def _delta_nbytes(self, i, width, skip, colors):
+        """Encoded size of the change from the start of sample run i to the frame skip later"""
+        img = self._sample_image(i, skip, width)
+        bbox, mask = gif_delta(self._sample_image(i, 0, width), img, GifWriter.delta_threshold)
+        if bbox is None:
+            return 0
+        region = img.crop(bbox)
+        frame, transparency = quantize_gif_delta(region, mask, colors)
+        return gif_frame_nbytes(frame, offset=bbox[:2], disposal=1, transparency=transparency)
+
+    def estimate(self, width, skip, colors):
+        """Estimated file size in bytes for one candidate"""
+        if self.samples is None:
+            self._load_samples()
+        key = (width, colors)
+        first = self.frame_bytes.get(key)
+        if first is None:
+            sizes = [gif_frame_nbytes(self._sample_frame(i, width, colors))
+                     for i in range(len(self.samples))]
+            first = sum(sizes) / max(1, len(sizes))
+            self.frame_bytes[key] = first
+        key = (width, skip, colors)
+        delta = self.delta_bytes.get(key)
+        if delta is None:
+            sizes = [self._delta_nbytes(i, width, skip, colors)
+                     for i in range(len(self.samples)) if len(self.samples[i]) > skip]
+            delta = sum(sizes) / len(sizes) if sizes else first
+            self.delta_bytes[key] = delta
+        kept = (len(self.frames) + skip - 1) // skip
+        estimate = int(self.overhead_bytes + first + delta * (kept - 1))
+        self.estimates[(width, skip, colors)] = estimate
+        return estimate
+
+    def fit(self, output_path, progress=None, cancel_event=None):
+        """Encode the best candidate that fits and return the parameters used.
+
+        Returns a dict with width, fps, skip, colors, size_kb, estimated_kb,
+        attempts (full encodes) and fits, or None if nothing could be encoded
+        or cancel_event was set. progress(done, total) counts the frames of
+        the current encode.
+        """
+        if not self.frames or self.max_bytes <= 0:
+            return None
+        if self.samples is None:
+            self._load_samples()
+        if not self.samples:
+            return None
+
+        correction = 1.0
+        attempts = 0
+        result = None
+        tried = set()
+        # Lowest quality there is, encoded when nothing is estimated to fit
+        _, skip, colors = self._settings()[-1]
+        smallest = (self._widths()[-1][1], skip, colors)
+        while attempts < self.max_attempts:
+            candidate = self._search(self.max_bytes * self.margin / correction, tried)
+            if candidate is None:
+                if smallest in tried:
+                    break
+                candidate = smallest
+            tried.add(candidate)
+            width, skip, colors = candidate
+            estimated = self.estimate(width, skip, colors)
+            attempts += 1
+            fps = max(1, round(self.fps / skip))
+            kept = self.frames[::skip]
+            frames = self.player.iter_frames(kept, size=(width, self._height(width)),
+                                             scale_flags='lanczos')
+            frames = report_frames(frames, len(kept), progress, cancel_event)
+            if not self.player.ffmpeg.create_gif(frames, output_path,
+                                                 fps=fps, loop=self.loop, colors=colors):
+                return None
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+
+            actual = os.path.getsize(output_path)
+            result = {
+                'width': width,
+                'fps': fps,
+                'skip': skip,
+                'colors': colors,
+                'frames': len(kept),
+                'size_kb': actual / 1024,
+                'estimated_kb': estimated / 1024,
+                'attempts': attempts,
+                'fits': actual <= self.max_bytes,
+            }
+            if result['fits']:
+                break
+            correction = max(correction, actual / max(1, estimated))
+        return result
+
+
+# ============================================================
+# Streaming API
+# ============================================================
+
+def _decode_stream(path, frames, size, pix_fmt, workers, scale_flags, cache):
+    """Open path and yield (frame_number, image) for frames, in ascending order"""
+    player = VideoPlayer(disk_cache=cache or False)
+    try:
+        if not player.load_video(path):
+            raise RuntimeError(f"Failed to load video: {path}")
+        total = player.video_info['total_frames']
+        if frames is None:
+            frames = range(total)
+        else:
+            frames = [f for f in frames if 0 <= f < total]
+        if frames:
+            yield from player.iter_frames(frames, size, scale_flags, workers, pix_fmt)
+    finally:
+        player.cleanup()
+
+
+def _to_array():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("as_array=True requires NumPy (pip install numpy)") from None
+    return numpy.asarray
+
+
+def _read_ahead(items, buffer, stop):
+    """Run the items generator on a worker thread, feeding a queue of at most buffer entries.
+
+    Yields the items; an exception on the worker is raised here. Setting
+    stop makes the worker close the generator and exit.
+    """
+    results = queue.Queue(buffer)
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                if not put(item):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            items.close()
+            put(done)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def iter_frames(path, frames=None, size=None, pix_fmt='rgb24', as_array=False, workers=None,
+                buffer=8, scale_flags=None, cache=None):
+    """Stream decoded frames of a video as (frame_number, image) pairs.
+
+    frames: 0-based frame numbers (any iterable; default: every frame),
+    yielded in ascending order. size: (width, height) to scale to.
+    pix_fmt: 'rgb24', 'rgba' or 'gray'. With as_array, images are NumPy
+    arrays (height x width[ x channels]) instead of PIL images.
+
+    Frames are decoded in one sequential pass (or keyframe-aligned
+    parallel segments for long ranges, see `workers`) on a background
+    thread that stays at most `buffer` frames ahead of the caller, so
+    memory stays constant however many frames are read. buffer=0 decodes
+    on the caller's thread instead. Stop early by closing the generator
+    or breaking out of the loop.
+
+    Nothing is written to disk unless cache is given: pass a DiskCache
+    (DiskCache() is the app's own) to keep the frame index of each video,
+    so the next call on it skips the packet scan.
+    """
+    if pix_fmt not in PIX_FMTS:
+        raise ValueError(f"Unsupported pix_fmt: {pix_fmt}")
+    convert = _to_array() if as_array else None
+    items = _decode_stream(path, frames, size, pix_fmt, workers, scale_flags, cache)
+    stop = threading.Event()
+    if buffer > 0:
+        items = _read_ahead(items, buffer, stop)
+    try:
+        for frame, img in items:
+            yield frame, convert(img) if convert else img
+    finally:
+        stop.set()
+        items.close()
+
+
+async def aiter_frames(path, frames=None, size=None, pix_fmt='rgb24', as_array=False, workers=None,
+                       buffer=8, scale_flags=None, cache=None):
+    """Async variant of iter_frames, for `async for frame, image in aiter_frames(...)`.
+
+    Decoding runs on a worker thread and never blocks the event loop; it
+    pauses whenever `buffer` frames are waiting to be consumed.
+    """
+    if pix_fmt not in PIX_FMTS:
+        raise ValueError(f"Unsupported pix_fmt: {pix_fmt}")
+    convert = _to_array() if as_array else None
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue(max(1, buffer))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(results.put(item), loop)
+        while not stop.is_set():
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                pass
+        future.cancel()
+        return False
+
+    def worker():
+        items = _decode_stream(path, frames, size, pix_fmt, workers, scale_flags, cache)
+        try:
+            for frame, img in items:
+                if not put((frame, convert(img) if convert else img)):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            items.close()
+            put(done)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = await results.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        await loop.run_in_executor(None, thread.join)